@@ -0,0 +1,138 @@
+"""Offline benchmarks for the chatterbox subscript.
+
+    python chatterbox_bench.py rtf --device cpu --threads 8
+    python chatterbox_bench.py postprocess
+
+``rtf`` reports the real-time factor (synthesis seconds per second of audio,
+lower is better) of the fp32 model and, on CPU, of the same model after int8
+dynamic quantization.
+
+``postprocess`` times the silence trim / loudness stage per second of audio,
+on synthetic speech-like clips or on ``--wav`` files, and reports how much
+audio trimming removes. It doesn't load the model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import math
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+
+import chatterbox_subscript as sub
+
+BENCH_SENTENCES = [
+    "Thanks for the follow!",
+    "Welcome in, everyone, grab a snack and get comfy.",
+    "Thank you so much for the raid, that was an incredible stream and "
+    "I hope you all had as much fun as we did tonight.",
+]
+
+
+def _measure_rtf(model, sentences: list[str], runs: int) -> list[float]:
+    rtfs = []
+    for _ in range(runs):
+        for text in sentences:
+            started = time.perf_counter()
+            with torch.inference_mode():
+                wav = model.generate(text=text, language_id="en")
+            elapsed = time.perf_counter() - started
+            rtfs.append(elapsed / (wav.shape[-1] / model.sr))
+    return rtfs
+
+
+def _report(label: str, rtfs: list[float]) -> float:
+    mean = statistics.fmean(rtfs)
+    print(
+        f"{label:>6}: mean RTF {mean:.3f}  "
+        f"min {min(rtfs):.3f}  max {max(rtfs):.3f}  (n={len(rtfs)})"
+    )
+    return mean
+
+
+def bench_rtf(args: argparse.Namespace) -> None:
+    model = sub._load_model(args.device, "none", args.threads, args.interop_threads)
+    if args.voice:
+        model.prepare_conditionals(args.voice)
+
+    # One untimed pass so lazy initialisation doesn't land in the numbers.
+    _measure_rtf(model, BENCH_SENTENCES[:1], 1)
+    fp32 = _report("fp32", _measure_rtf(model, BENCH_SENTENCES, args.runs))
+
+    if str(model.device) != "cpu":
+        print("int8 skipped: dynamic quantization is CPU-only")
+        return
+    sub._quantize_int8(model)
+    _measure_rtf(model, BENCH_SENTENCES[:1], 1)
+    int8 = _report("int8", _measure_rtf(model, BENCH_SENTENCES, args.runs))
+    print(f"int8 speedup: {fp32 / int8:.2f}x")
+
+
+def _synthetic_clip(secs: float, rng: np.random.Generator) -> np.ndarray:
+    """Syllable-rate modulated noise with silence on both ends."""
+    sr = sub.SAMPLE_RATE
+    t = np.arange(int(secs * sr)) / sr
+    envelope = np.clip(np.sin(2 * math.pi * 4 * t), 0, None) ** 2
+    voiced = (rng.standard_normal(len(t)) * envelope * 0.1).astype(np.float32)
+    lead = np.zeros(int(rng.uniform(0.2, 0.6) * sr), dtype=np.float32)
+    tail = np.zeros(int(rng.uniform(0.3, 1.0) * sr), dtype=np.float32)
+    return np.concatenate([lead, voiced, tail])
+
+
+def bench_postprocess(args: argparse.Namespace) -> None:
+    if args.wav:
+        import soundfile
+
+        clips = [soundfile.read(path, dtype="float32")[0] for path in args.wav]
+    else:
+        rng = np.random.default_rng(0)
+        clips = [_synthetic_clip(secs, rng) for secs in (1, 3, 10, 30)]
+
+    sr = sub.SAMPLE_RATE
+    for clip in clips:
+        out = sub._postprocess(clip)  # warm up allocations
+        times = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            out = sub._postprocess(clip)
+            times.append(time.perf_counter() - started)
+        secs = len(clip) / sr
+        print(
+            f"{secs:6.2f}s clip: {statistics.median(times) * 1000:7.3f} ms "
+            f"({statistics.median(times) / secs * 1000:.3f} ms per audio second), "
+            f"trimmed {(len(clip) - len(out)) / sr:.2f}s "
+            f"({1 - len(out) / len(clip):.0%})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rtf = commands.add_parser("rtf", help="real-time factor, fp32 vs int8")
+    rtf.add_argument("--device", choices=["auto", "cuda", "cpu"], default="cpu")
+    rtf.add_argument("--threads", type=int)
+    rtf.add_argument("--interop-threads", type=int)
+    rtf.add_argument("--runs", type=int, default=3)
+    rtf.add_argument("--voice", help="reference clip (default: built-in voice)")
+    rtf.set_defaults(func=bench_rtf)
+
+    post = commands.add_parser("postprocess", help="post-processing cost")
+    post.add_argument("--runs", type=int, default=50)
+    post.add_argument("--wav", nargs="*", help="clips to use instead of synthetic")
+    post.set_defaults(func=bench_postprocess)
+
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error("--runs must be at least 1")
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Load test for the chatterbox subscript's serving layer.
+
+    python chatterbox_loadtest.py --concurrency 8 --requests 200
+
+By default this starts the subscript with ``--fake-model`` in a scratch
+model directory, so no GPU or weights are needed and inference time is
+known. ``--socket``/``--port`` target a subscript that is already running
+instead.
+
+Each client keeps one persistent connection and sends requests back to
+back. The report gives throughput and client latency, and splits the
+server's time per request into waiting for the inference worker (the one
+lock every request contends for), inference, and the remaining overhead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import wave
+
+import chatterbox_subscript as sub
+from tts_replay import _percentile
+
+LOADTEST_TEXTS = [
+    "Thanks for the follow!",
+    "Welcome in, everyone, grab a snack and get comfy.",
+    "Thank you so much for the raid, that was an incredible stream and "
+    "I hope you all had as much fun as we did tonight.",
+]
+STARTUP_TIMEOUT_SECS = 60
+
+
+def _scrape(port: int) -> dict[str, float]:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as r:
+        text = r.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            samples[series] = float(value)
+    return samples
+
+
+def _start_fake_subscript(
+    model_dir: str, port: int, socket_path: str, fake_rtf: float
+) -> subprocess.Popen:
+    # A silent reference clip; the fake model never looks at it.
+    with wave.open(os.path.join(model_dir, "to_clone.wav"), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sub.SAMPLE_RATE)
+        f.writeframes(bytes(2 * sub.SAMPLE_RATE))
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            sub.__file__,
+            "--fake-model",
+            "--fake-rtf",
+            str(fake_rtf),
+            "--port",
+            str(port),
+            "--socket",
+            socket_path,
+        ],
+        env={**os.environ, "CHATTERBOX_MODEL_DIR": model_dir},
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECS
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"fake subscript exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("fake subscript failed to start within timeout")
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, params: dict
+) -> str:
+    """Send one generate request and read its reply; returns the outcome."""
+    payload = json.dumps(params).encode()
+    writer.write(sub._REQUEST_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+    while True:
+        kind, length = sub._FRAME_HEADER.unpack(
+            await reader.readexactly(sub._FRAME_HEADER.size)
+        )
+        body = await reader.readexactly(length)
+        if kind == sub.FRAME_END:
+            return "ok"
+        if kind == sub.FRAME_ERROR:
+            return str(json.loads(body).get("status", "error"))
+
+
+async def _client(
+    socket_path: str,
+    todo: asyncio.Queue,
+    args: argparse.Namespace,
+    results: list[tuple[str, float]],
+) -> None:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        while not todo.empty():
+            text = todo.get_nowait()
+            params = {"text": text, "language_id": args.language, "stream": args.stream}
+            started = time.monotonic()
+            outcome = await _request(reader, writer, params)
+            results.append((outcome, time.monotonic() - started))
+    finally:
+        writer.close()
+
+
+async def _drive(socket_path: str, args: argparse.Namespace) -> tuple[list, float]:
+    todo: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        todo.put_nowait(LOADTEST_TEXTS[i % len(LOADTEST_TEXTS)])
+    results: list[tuple[str, float]] = []
+    started = time.monotonic()
+    await asyncio.gather(
+        *(_client(socket_path, todo, args, results) for _ in range(args.concurrency))
+    )
+    return results, time.monotonic() - started
+
+
+def _delta(before: dict, after: dict, name: str) -> tuple[float, float]:
+    """``(sum, count)`` a histogram gained between two scrapes."""
+    return (
+        after.get(f"{name}_sum", 0.0) - before.get(f"{name}_sum", 0.0),
+        after.get(f"{name}_count", 0.0) - before.get(f"{name}_count", 0.0),
+    )
+
+
+def _report(
+    results: list[tuple[str, float]], elapsed: float, before: dict, after: dict
+) -> None:
+    outcomes: dict[str, int] = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    print(
+        f"{len(results)} requests in {elapsed:.2f}s "
+        f"({len(results) / elapsed:.2f} req/s), outcomes {outcomes}"
+    )
+    latencies = [latency for outcome, latency in results if outcome == "ok"]
+    if not latencies:
+        return
+    print(
+        f"  client latency: mean {statistics.fmean(latencies) * 1000:8.1f} ms  "
+        f"p50 {_percentile(latencies, 50) * 1000:8.1f}  "
+        f"p95 {_percentile(latencies, 95) * 1000:8.1f}  "
+        f"p99 {_percentile(latencies, 99) * 1000:8.1f}"
+    )
+
+    request_sum, requests = _delta(before, after, "chatterbox_request_seconds")
+    wait_sum, jobs = _delta(before, after, "chatterbox_queue_wait_seconds")
+    synthesis_sum, _ = _delta(before, after, "chatterbox_synthesis_seconds")
+    if not requests or not jobs:
+        return
+    # Jobs decoded together each count the whole batch's time, so this is
+    # the average number of jobs on the GPU rather than a utilization.
+    batch = synthesis_sum / elapsed
+    print(
+        f"  per job: queue wait {wait_sum / jobs * 1000:8.1f} ms  "
+        f"inference {synthesis_sum / jobs * 1000:8.1f} ms  "
+        f"(jobs decoding {batch:.2f})"
+    )
+    # Everything the server spent on a request besides waiting for and
+    # running the model: parsing, scheduling, stitching, framing.
+    overhead = (request_sum - wait_sum - synthesis_sum) / requests
+    transport = statistics.fmean(latencies) - request_sum / requests
+    print(
+        f"  per request overhead excluding inference: "
+        f"server {overhead * 1000:.2f} ms, socket and client {transport * 1000:.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--language", default="en")
+    parser.add_argument(
+        "--stream", action="store_true", help="split requests into sentences"
+    )
+    parser.add_argument(
+        "--fake-rtf",
+        type=float,
+        default=0.05,
+        help="synthesis seconds per audio second of the spawned fake model",
+    )
+    parser.add_argument("--socket", help="use a running subscript's socket")
+    parser.add_argument("--port", type=int, default=8766, help="its HTTP port")
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.requests < 1:
+        parser.error("--concurrency and --requests must be positive")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        proc = None
+        socket_path = args.socket
+        if socket_path is None:
+            socket_path = os.path.join(scratch, "chatterbox.sock")
+            proc = _start_fake_subscript(scratch, args.port, socket_path, args.fake_rtf)
+        try:
+            before = _scrape(args.port)
+            results, elapsed = asyncio.run(_drive(socket_path, args))
+            after = _scrape(args.port)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+    _report(results, elapsed, before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,105 +4,1786 @@
 from __future__ import annotations
 
 import argparse
-import http.server
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import hashlib
 import io
 import json
 import logging
+import math
 import os
+import re
+import struct
 import sys
 import threading
+import time
+import typing
+import uuid
+import wave
 
-import soundfile
+import aiohttp.web
+import numpy as np
 import torch
 
-CHATTERBOX_MODEL_DIR = "/chatterbox_models"
+CHATTERBOX_MODEL_DIR = os.getenv("CHATTERBOX_MODEL_DIR", "/chatterbox_models")
 AUDIO_PROMPT_PATH = os.path.join(CHATTERBOX_MODEL_DIR, "to_clone.wav")
+VOICES_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "voices")
 HF_CACHE_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "huggingface")
+# Checkpoint files copied out of the HF cache by --materialize-weights, so
+# startup can load them directly instead of resolving the hub snapshot.
+WEIGHTS_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "weights")
+WEIGHTS_COMPLETE_MARKER = ".complete"
+SAMPLE_RATE = 24000
+MAX_QUEUE_DEPTH = 16
+MAX_BATCH_SIZE = 4
+VOICE_CACHE_SIZE = 4
 
-_lock: threading.Lock | None = None
+SOCKET_PATH = "/tmp/chatterbox.sock"
+_REQUEST_HEADER = struct.Struct(">I")
+_FRAME_HEADER = struct.Struct(">cI")
+FRAME_AUDIO = b"A"
+FRAME_END = b"E"
+FRAME_ERROR = b"X"
+STREAM_MAX_SEGMENT_CHARS = 200
+STREAM_MIN_SEGMENT_CHARS = 24
+CHUNK_MAX_CHARS = 300
+CROSSFADE_SECS = 0.04
+# Output-length guard. T3 gets a speech token budget proportional to the
+# chunk's text (S3 tokens run at 25 per second) under a hard ceiling, and a
+# generation that ends holding one token has the held run cut short.
+MAX_NEW_SPEECH_TOKENS = 1000
+SPEECH_TOKENS_PER_TEXT_TOKEN = 10.0
+MIN_SPEECH_TOKEN_BUDGET = 50
+MAX_TRAILING_REPEAT = 12
+TRAILING_REPEAT_KEEP = 4
+# T3 sampling, as ChatterboxMultilingualTTS.generate sets it (top_p is 1.0,
+# which filters nothing).
+T3_TEMPERATURE = 0.8
+T3_REPETITION_PENALTY = 2.0
+T3_MIN_P = 0.05
+
+# Post-processing of finished audio (see _postprocess).
+TRIM_FRAME_SECS = 0.01
+TRIM_THRESHOLD_DB = -40.0  # relative to the loudest frame
+TRIM_PAD_SECS = 0.05
+TARGET_LOUDNESS_DBFS = -20.0  # RMS over voiced frames
+MAX_GAIN_DB = 12.0
+PEAK_CEILING = 0.89  # -1 dBFS
+TAIL_FADE_SECS = 0.03
+
+# Shortest-job-first: a job's cost is its length in English-equivalent
+# characters. Waiting earns AGING_CHARS_PER_SEC of credit per second, so a
+# long job can't be starved by a stream of short ones, and each priority
+# step is worth PRIORITY_STEP_CHARS.
+AGING_CHARS_PER_SEC = 20.0
+PRIORITY_STEP_CHARS = 100.0
+# Spoken seconds per character relative to English.
+LANGUAGE_COST_FACTORS = {"zh": 3.0, "ja": 2.0, "ko": 2.0}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？…])\s+|(?<=[。！？])")
+_CLAUSE_END = re.compile(r"(?<=[,;:、，；：])\s*")
+_VOICE_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 240)
+_AUDIO_BUCKETS = (0.5, 1, 2, 5, 10, 20, 40, 80)
+_RTF_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 4)
+
+_scheduler: _Scheduler | None = None
+_alignment_spy: _AlignmentSpy | None = None
+_postprocess_enabled = True
+_speech_token_ratio = SPEECH_TOKENS_PER_TEXT_TOKEN
+_max_speech_tokens = MAX_NEW_SPEECH_TOKENS
 _model = None
+_voices: _VoiceRegistry | None = None
+_cpu_pool: concurrent.futures.ThreadPoolExecutor | None = None
+_preprocess_pool: concurrent.futures.ThreadPoolExecutor | None = None
 
 
-class _Handler(http.server.BaseHTTPRequestHandler):
-    def log_message(self, fmt: str, *args: object) -> None:
-        pass
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _split_on(pattern: re.Pattern[str], text: str) -> list[str]:
+    return [p.strip() for p in pattern.split(text) if p.strip()]
+
+
+def _split_text(
+    text: str,
+    max_chars: int = STREAM_MAX_SEGMENT_CHARS,
+    min_chars: int = STREAM_MIN_SEGMENT_CHARS,
+) -> list[str]:
+    """Split ``text`` into segments of at most ``max_chars`` characters.
 
-    def _json_error(self, msg: str, status: int) -> None:
-        body = json.dumps({"error": msg}).encode()
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
-
-    def do_GET(self) -> None:
-        if self.path == "/health":
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", "2")
-            self.end_headers()
-            self.wfile.write(b"{}")
+    Sentences longer than ``max_chars`` are broken further at clause
+    punctuation, then at whitespace. The first segment is kept short (it
+    only absorbs neighbours while under ``min_chars``, so "Hi!" doesn't get a
+    call of its own) to get the first audio out quickly; later sentences are
+    packed greedily up to ``max_chars``.
+    """
+    pieces: list[str] = []
+    for sentence in _split_on(_SENTENCE_END, text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in _split_on(_CLAUSE_END, sentence):
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                pieces.append(clause[:cut].strip())
+                clause = clause[cut:].strip()
+            if clause:
+                pieces.append(clause)
+
+    segments: list[str] = []
+    for piece in pieces:
+        if (
+            segments
+            and (len(segments) > 1 or len(segments[0]) < min_chars)
+            and len(segments[-1]) + len(piece) < max_chars
+        ):
+            segments[-1] = f"{segments[-1]} {piece}"
         else:
-            self._json_error("not found", 404)
+            segments.append(piece)
+    return segments or [text]
 
-    def do_POST(self) -> None:
-        if self.path != "/generate":
-            self._json_error("not found", 404)
-            return
 
-        content_length = self.headers.get("Content-Length")
-        if not content_length:
-            self._json_error("missing Content-Length", 400)
-            return
+def _pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def _crossfade_concat(pieces: list[np.ndarray], fade: int) -> np.ndarray:
+    """Join chunks, overlapping each seam by up to ``fade`` samples.
+
+    Each overlap is a linear ramp applied as one vectorized mix, so the
+    cost is proportional to the number of seams, not the audio length. A
+    seam takes at most half of either side, so a short chunk is blended
+    rather than swallowed by its neighbours.
+    """
+    if len(pieces) == 1:
+        return pieces[0]
+    out = np.empty(sum(len(p) for p in pieces), dtype=np.float32)
+    pos = 0
+    last = 0  # samples the previous chunk left in ``out``
+    for piece in pieces:
+        overlap = min(fade, last // 2, len(piece) // 2)
+        if overlap:
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            seam = out[pos - overlap : pos]
+            seam *= 1.0 - ramp
+            seam += piece[:overlap] * ramp
+        rest = piece[overlap:]
+        out[pos : pos + len(rest)] = rest
+        pos += len(rest)
+        last = len(rest)
+    return out[:pos]
+
+
+def _postprocess(
+    samples: np.ndarray, trim_start: bool = True, trim_end: bool = True
+) -> np.ndarray:
+    """Trim silence, normalize loudness and fade out, all vectorized.
+
+    Frame energies come from one reshape; frames within TRIM_THRESHOLD_DB of
+    the loudest count as voiced. Edges are trimmed to the voiced span plus a
+    little padding (``trim_start``/``trim_end`` keep a stream's inner pauses).
+    The voiced RMS is brought to TARGET_LOUDNESS_DBFS, capped by
+    MAX_GAIN_DB and by the peak ceiling, and a trimmed end gets a short fade.
+    """
+    frame = int(TRIM_FRAME_SECS * SAMPLE_RATE)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return samples
+    energy = np.mean(
+        np.square(samples[: n_frames * frame].reshape(n_frames, frame)), axis=1
+    )
+    loudest = energy.max()
+    if loudest <= 0.0:
+        return samples
+    voiced = energy >= loudest * 10 ** (TRIM_THRESHOLD_DB / 10)
+    active = np.flatnonzero(voiced)
+    pad = int(TRIM_PAD_SECS * SAMPLE_RATE)
+    start = max(0, active[0] * frame - pad) if trim_start else 0
+    end = min(len(samples), (active[-1] + 1) * frame + pad) if trim_end else None
+    out = samples[start:end].astype(np.float32, copy=True)
+
+    rms = np.sqrt(np.mean(energy[voiced]))
+    gain = min(
+        10 ** ((TARGET_LOUDNESS_DBFS - 20 * np.log10(rms)) / 20),
+        10 ** (MAX_GAIN_DB / 20),
+        PEAK_CEILING / max(float(np.abs(out).max()), 1e-9),
+    )
+    out *= gain
+
+    if trim_end:
+        fade = min(len(out), int(TAIL_FADE_SECS * SAMPLE_RATE))
+        out[len(out) - fade :] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)
+    return out
+
+
+def _conds_artifact_path(ref_path: str, digest: str) -> str:
+    stem, _ = os.path.splitext(ref_path)
+    return f"{stem}.{digest[:16]}.conds.pt"
+
+
+def _remove_stale_artifacts(ref_path: str, keep: str) -> None:
+    stem, _ = os.path.splitext(ref_path)
+    directory = os.path.dirname(ref_path) or "."
+    prefix = os.path.basename(stem) + "."
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(prefix) and name.endswith(".conds.pt") and path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _VoiceConditioning:
+    """Keeps the prepared conditionals for a reference clip resident.
+
+    ``get`` is cheap while the clip is unchanged: it only stats the file.
+    When the mtime or size moves, the file is re-hashed and the
+    conditionals are rebuilt only if the content actually changed.
+
+    Prepared conditionals are also serialized next to the clip, keyed by its
+    content hash, so a fresh container can load them instead of decoding
+    and embedding the reference again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._stat: tuple[int, int] | None = None
+        self._digest: str | None = None
+        self._conds = None
+
+    def get(self):
+        st = os.stat(self._path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if self._conds is not None and stat_key == self._stat:
+            return self._conds
+
+        digest = _file_digest(self._path)
+        if self._conds is None or digest != self._digest:
+            self._conds = self._load_or_prepare(digest)
+            self._digest = digest
+        self._stat = stat_key
+        return self._conds
+
+    def _load_or_prepare(self, digest: str):
+        log = logging.getLogger(__name__)
+        if isinstance(_model, _FakeModel):
+            # Nothing worth persisting, and no chatterbox types to do it with.
+            _model.prepare_conditionals(self._path)
+            return _model.conds
+
+        from chatterbox.mtl_tts import (  # pyright: ignore[reportMissingImports]
+            Conditionals,
+        )
+
+        artifact = _conds_artifact_path(self._path, digest)
+        if os.path.exists(artifact):
+            try:
+                conds = Conditionals.load(artifact, map_location=_model.device)
+                log.info("Loaded voice conditionals from %s", artifact)
+                return conds.to(_model.device)
+            except Exception:
+                log.exception("Failed to load %s, preparing from scratch", artifact)
+
+        log.info("Preparing voice conditionals for %s (%s)", self._path, digest[:12])
+        _model.prepare_conditionals(self._path)
+        conds = _model.conds
         try:
-            raw = self.rfile.read(int(content_length))
-            req = json.loads(raw)
-        except Exception:
-            self._json_error("invalid json", 400)
+            tmp = f"{artifact}.{uuid.uuid4().hex}.tmp"
+            conds.save(tmp)
+            os.replace(tmp, artifact)
+            _remove_stale_artifacts(self._path, keep=artifact)
+            log.info("Saved voice conditionals to %s", artifact)
+        except OSError:
+            log.exception("Failed to persist voice conditionals")
+        return conds
+
+
+def _voice_path(voice_id: str | None) -> str:
+    """Map a request's ``voice_id`` to its reference clip.
+
+    No id means the default cloned voice; anything else must be a plain name
+    of a ``<voice_id>.wav`` in ``VOICES_DIR``.
+    """
+    if not voice_id:
+        return AUDIO_PROMPT_PATH
+    if not isinstance(voice_id, str) or not _VOICE_ID.fullmatch(voice_id):
+        raise ValueError(f"invalid voice_id: {voice_id!r}")
+    return os.path.join(VOICES_DIR, f"{voice_id}.wav")
+
+
+class _VoiceRegistry:
+    """Size-bounded LRU of prepared voices, keyed by ``voice_id``.
+
+    Only the inference worker calls ``get``, but ``status`` is read from the
+    event loop, hence the lock.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._voices: collections.OrderedDict[str, _VoiceConditioning] = (
+            collections.OrderedDict()
+        )
+
+    def get(self, voice_id: str | None):
+        key = voice_id or ""
+        with self._lock:
+            voice = self._voices.pop(key, None)
+            if voice is None:
+                voice = _VoiceConditioning(_voice_path(voice_id))
+            self._voices[key] = voice
+            while len(self._voices) > self._capacity:
+                evicted, _ = self._voices.popitem(last=False)
+                logging.getLogger(__name__).info(
+                    "Evicted voice %r from cache", evicted or "default"
+                )
+        return voice.get()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "voices_resident": [k or "default" for k in self._voices],
+                "voice_capacity": self._capacity,
+            }
+
+
+class _Counter:
+    def __init__(self, name: str, doc: str, label: str | None = None) -> None:
+        self.name = name
+        self.doc = doc
+        self._label = label
+        self._lock = threading.Lock()
+        self._values: dict[str, float] = {}
+
+    def inc(self, label: str = "", amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label] = self._values.get(label, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self._label:
+            values[""] = 0.0
+        for label, value in sorted(values.items()):
+            suffix = f'{{{self._label}="{label}"}}' if self._label else ""
+            lines.append(f"{self.name}{suffix} {value:g}")
+        return lines
+
+
+class _Histogram:
+    def __init__(self, name: str, doc: str, buckets: tuple[float, ...]) -> None:
+        self.name = name
+        self.doc = doc
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for bound, count in zip(self._buckets, self._counts):
+                lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {self._count}')
+            lines.append(f"{self.name}_sum {self._sum:.6f}")
+            lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+class _Metrics:
+    """Process-wide counters and histograms, rendered for ``/metrics``."""
+
+    def __init__(self) -> None:
+        self.requests = _Counter(
+            "chatterbox_requests_total", "Generate requests by status.", "status"
+        )
+        self.errors = _Counter(
+            "chatterbox_generate_errors_total", "Jobs that failed to generate."
+        )
+        self.deadline_dropped = _Counter(
+            "chatterbox_deadline_dropped_jobs_total",
+            "Jobs dropped before generation because their deadline had passed "
+            "or could not be met, by stage.",
+            "stage",
+        )
+        self.length_guard = _Counter(
+            "chatterbox_length_guard_total",
+            "Chunks cut short by the output-length guard, by reason.",
+            "reason",
+        )
+        self.cancelled = _Counter(
+            "chatterbox_cancelled_jobs_total",
+            "Jobs abandoned by their client before finishing, by stage.",
+            "stage",
+        )
+        self.request_seconds = _Histogram(
+            "chatterbox_request_seconds",
+            "Time to handle a generate request.",
+            _LATENCY_BUCKETS,
+        )
+        self.queue_wait = _Histogram(
+            "chatterbox_queue_wait_seconds",
+            "Time a job waited before its first chunk started decoding.",
+            _LATENCY_BUCKETS,
+        )
+        self.synthesis = _Histogram(
+            "chatterbox_synthesis_seconds",
+            "Inference time per job.",
+            _LATENCY_BUCKETS,
+        )
+        self.audio = _Histogram(
+            "chatterbox_audio_seconds",
+            "Seconds of audio produced per job.",
+            _AUDIO_BUCKETS,
+        )
+        self.rtf = _Histogram(
+            "chatterbox_real_time_factor",
+            "Inference seconds per second of audio produced.",
+            _RTF_BUCKETS,
+        )
+
+    def render(self, gauges: dict[str, float]) -> str:
+        lines: list[str] = []
+        for metric in (
+            self.requests,
+            self.errors,
+            self.cancelled,
+            self.deadline_dropped,
+            self.length_guard,
+            self.request_seconds,
+            self.queue_wait,
+            self.synthesis,
+            self.audio,
+            self.rtf,
+        ):
+            lines.extend(metric.render())
+        for name, value in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = _Metrics()
+
+
+@dataclasses.dataclass(eq=False)
+class _Job:
+    text: str
+    language_id: str
+    cfg_weight: float
+    exaggeration: float
+    voice_id: str | None
+    future: asyncio.Future[bytes]
+    priority: int = 0
+    # Whether post-processing may trim this job's leading/trailing silence;
+    # inner segments of a stream keep theirs as the pause between sentences.
+    trim_start: bool = True
+    trim_end: bool = True
+    # Later segments of a stream are scheduled behind its first one.
+    head: _Job | None = None
+    index: int = 0
+    # Monotonic time after which the result is useless to the client.
+    expires: float | None = None
+    submitted: float = dataclasses.field(default_factory=time.monotonic)
+    cancelled: bool = False
+    # One tokenization per chunk, started by _preprocess at submission.
+    chunks: list[concurrent.futures.Future] = dataclasses.field(default_factory=list)
+    # Stage durations, filled in by the worker for the reply trailer.
+    wait_secs: float = 0.0
+    gpu_secs: float = 0.0
+    post_secs: float = 0.0
+
+    @property
+    def cost(self) -> float:
+        return len(self.text) * LANGUAGE_COST_FACTORS.get(self.language_id, 1.0)
+
+    def score(self, now: float) -> float:
+        """Scheduling order, lowest first.
+
+        A stream is ordered as one unit by its first segment, so its own
+        segments can never overtake each other.
+        """
+        head = self.head or self
+        return (
+            head.cost
+            - AGING_CHARS_PER_SEC * (now - head.submitted)
+            - PRIORITY_STEP_CHARS * head.priority
+            + self.index
+        )
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"queue full, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _Scheduler:
+    """Bounded job queue in front of the single inference worker.
+
+    Jobs are submitted from the event loop and resolved through their
+    futures. Whenever the worker thread is free it takes the up to
+    ``max_batch`` pending jobs with the lowest ``score`` (shortest first,
+    with aging and priority) and decodes them as one batch. There is no
+    collection window: jobs that arrive while a batch runs make up the next
+    one, so a lone request starts at once. Submitting past ``max_depth`` raises
+    ``QueueFullError`` with an estimate of how long the current backlog will
+    take to drain.
+
+    Jobs with an ``expires`` time are refused at submission if the work
+    scheduled ahead of them would already take too long, and dropped from
+    the queue once it passes, both with ``DeadlineExceededError``.
+    """
+
+    def __init__(self, max_batch: int, max_depth: int) -> None:
+        self._max_batch = max_batch
+        self._max_depth = max_depth
+        self._cond = threading.Condition()
+        self._pending: list[_Job] = []
+        self._running = 0
+        self._avg_job_secs = 2.0
+
+    @property
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def retry_after(self) -> float:
+        with self._cond:
+            return (len(self._pending) + self._running) * self._avg_job_secs
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "queue_depth": len(self._pending),
+                "running": self._running,
+                "queue_capacity": self._max_depth,
+                "avg_job_secs": round(self._avg_job_secs, 3),
+                "retry_after": math.ceil(
+                    (len(self._pending) + self._running) * self._avg_job_secs
+                ),
+            }
+
+    def submit(self, jobs: list[_Job]) -> None:
+        with self._cond:
+            # A long stream may need more slots than the queue has; it is
+            # still admitted when nothing else is waiting.
+            if self._pending and len(self._pending) + len(jobs) > self._max_depth:
+                raise QueueFullError(
+                    (len(self._pending) + self._running) * self._avg_job_secs
+                )
+            head = jobs[0]
+            if head.expires is not None:
+                now = time.monotonic()
+                ahead = sum(j.score(now) <= head.score(now) for j in self._pending)
+                eta = (ahead + self._running + 1) * self._avg_job_secs
+                if now + eta > head.expires:
+                    _metrics.deadline_dropped.inc("admission", len(jobs))
+                    raise DeadlineExceededError(
+                        f"deadline in {head.expires - now:.1f}s, "
+                        f"expected to finish in {eta:.1f}s"
+                    )
+            self._pending.extend(jobs)
+            self._cond.notify()
+
+    def cancel(self, jobs: list[_Job]) -> None:
+        """Abandon ``jobs``: queued ones are dropped, a running one stops at
+        its next decode step. Jobs that already finished are unaffected."""
+        with self._cond:
+            for job in jobs:
+                job.cancelled = True
+            dropped = [j for j in self._pending if j.cancelled]
+            self._pending = [j for j in self._pending if not j.cancelled]
+        if dropped:
+            _metrics.cancelled.inc("queued", len(dropped))
+
+    def _take_batch(self) -> list[_Job]:
+        with self._cond:
+            while True:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                expired = [
+                    j
+                    for j in self._pending
+                    if j.expires is not None and j.expires <= now
+                ]
+                if not expired:
+                    break
+                self._pending = [j for j in self._pending if j not in expired]
+                _metrics.deadline_dropped.inc("queued", len(expired))
+                for job in expired:
+                    _resolve(job, None, DeadlineExceededError("expired in queue"))
+            batch = sorted(self._pending, key=lambda j: j.score(now))
+            batch = batch[: self._max_batch]
+            self._pending = [j for j in self._pending if j not in batch]
+            self._running = len(batch)
+        return batch
+
+    def _record(self, job_secs: float) -> None:
+        """Fold in the decode time per job of a batch that reached the GPU."""
+        with self._cond:
+            self._avg_job_secs = 0.8 * self._avg_job_secs + 0.2 * job_secs
+
+    def run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            try:
+                _generate_batch(batch, self._record)
+            finally:
+                with self._cond:
+                    self._running = 0
+
+
+def _resolve(job: _Job, pcm: bytes | None, error: BaseException | None) -> None:
+    def _set() -> None:
+        if job.future.done():
             return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(pcm)
+
+    job.future.get_loop().call_soon_threadsafe(_set)
+
+
+def _preprocess(jobs: list[_Job]) -> None:
+    """Queue tokenization of every chunk of ``jobs`` ahead of the worker.
+
+    Runs on its own thread so the next request's tokens are ready when the
+    worker takes it, instead of the GPU idling while they are computed.
+    """
+    assert _preprocess_pool is not None
+    for job in jobs:
+        job.chunks = [
+            _preprocess_pool.submit(_tokenize, chunk, job.language_id)
+            for chunk in _split_text(job.text, max_chars=CHUNK_MAX_CHARS)
+        ]
+
+
+def _text_frontend():
+    """The loaded model's supported language ids and text normalizer."""
+    if isinstance(_model, _FakeModel):
+        return _FakeModel.SUPPORTED_LANGUAGES, _FakeModel.punc_norm
+    from chatterbox.mtl_tts import (  # pyright: ignore[reportMissingImports]
+        SUPPORTED_LANGUAGES,
+        punc_norm,
+    )
+
+    return SUPPORTED_LANGUAGES, punc_norm
+
+
+def _tokenize(text: str, language_id: str) -> torch.Tensor:
+    """Normalize and tokenize one chunk on the CPU, CFG pair included.
+
+    Mirrors the preamble of ``ChatterboxMultilingualTTS.generate`` so it can
+    run on the CPU pool while the GPU is busy with the previous chunk.
+    """
+    import torch.nn.functional as F
+
+    supported_languages, punc_norm = _text_frontend()
+    language_id = language_id.lower() if language_id else language_id
+    if language_id and language_id not in supported_languages:
+        raise ValueError(f"Unsupported language_id {language_id!r}")
+    tokens = _model.tokenizer.text_to_tokens(punc_norm(text), language_id=language_id)
+    tokens = torch.cat([tokens, tokens], dim=0)
+    tokens = F.pad(tokens, (1, 0), value=_model.t3.hp.start_text_token)
+    return F.pad(tokens, (0, 1), value=_model.t3.hp.stop_text_token)
+
+
+def _t3_cond(conds, exaggeration: float):
+    """``conds.t3`` with ``exaggeration`` applied, leaving the cached voice as is."""
+    cond = conds.t3
+    if isinstance(_model, _FakeModel):
+        return cond  # _FakeT3Batch never reads it
+    if float(exaggeration) == float(cond.emotion_adv[0, 0, 0].item()):
+        return cond
+
+    from chatterbox.models.t3.modules.cond_enc import (  # pyright: ignore[reportMissingImports]
+        T3Cond,
+    )
+
+    return T3Cond(
+        speaker_emb=cond.speaker_emb,
+        cond_prompt_speech_tokens=cond.cond_prompt_speech_tokens,
+        cond_prompt_speech_emb=cond.cond_prompt_speech_emb,
+        emotion_adv=exaggeration * torch.ones(1, 1, 1),
+    ).to(device=_model.device)
+
+
+@dataclasses.dataclass(eq=False)
+class _Chunk:
+    """One chunk's row in a batched decode."""
+
+    conds: typing.Any  # the voice's Conditionals; S3Gen reads ``gen``
+    t3_cond: typing.Any
+    text_tokens: torch.Tensor  # the CFG pair from _tokenize
+    cfg_weight: float
+    job: _Job | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.job is not None and self.job.cancelled
+
 
-        text = req.get("text", "")
-        language_id = req.get("language_id", "en")
-        cfg_weight = req.get("cfg_weight", 0.5)
-        exaggeration = req.get("exaggeration", 0.5)
+def _speech_token_budget(n_text_tokens: int) -> int:
+    return min(
+        _max_speech_tokens,
+        MIN_SPEECH_TOKEN_BUDGET + int(_speech_token_ratio * n_text_tokens),
+    )
+
+
+def _trailing_repeat_start(tokens: torch.Tensor) -> int | None:
+    """Where to cut ``tokens`` if they end in an overlong run of one token.
+
+    Runaway generations tend to settle on a held token, which S3Gen renders
+    as a drone or dead air.
+    """
+    n = tokens.shape[-1]
+    if n <= MAX_TRAILING_REPEAT:
+        return None
+    differs = (tokens != tokens[-1]).nonzero()
+    run_start = int(differs[-1]) + 1 if len(differs) else 0
+    if n - run_start <= MAX_TRAILING_REPEAT:
+        return None
+    return run_start + TRAILING_REPEAT_KEEP
+
+
+def _repetition_penalty(
+    ids: torch.Tensor, scores: torch.Tensor, penalty: float
+) -> torch.Tensor:
+    """transformers' RepetitionPenaltyLogitsProcessor, row by row."""
+    seen = torch.gather(scores, 1, ids)
+    seen = torch.where(seen < 0, seen * penalty, seen / penalty)
+    return scores.scatter(1, ids, seen)
+
+
+def _min_p(scores: torch.Tensor, min_p: float) -> torch.Tensor:
+    """transformers' MinPLogitsWarper: drop tokens under ``min_p`` of the top."""
+    probs = torch.softmax(scores, dim=-1)
+    floor = min_p * probs.amax(dim=-1, keepdim=True)
+    return scores.masked_fill(probs < floor, -math.inf)
+
+
+class _AlignmentSpy:
+    """Captures the attention heads the multilingual alignment checks read.
 
-        if not os.path.exists(AUDIO_PROMPT_PATH):
-            self._json_error(
-                f"Audio prompt not found at {AUDIO_PROMPT_PATH}. "
-                "Run `modal run chatterbox_runner.py::upload_to_clone` first.",
-                500,
+    ``AlignmentStreamAnalyzer`` hooks the layers itself on every
+    ``T3.inference`` call (and never removes the hooks) and only looks at
+    batch row 0. These hooks are installed once and keep every conditioned
+    row, so each chunk of a batch gets its own analyzer.
+    """
+
+    def __init__(self, tfmr) -> None:
+        from chatterbox.models.t3.inference.alignment_stream_analyzer import (  # pyright: ignore[reportMissingImports]
+            LLAMA_ALIGNED_HEADS,
+        )
+
+        self.attns: list[torch.Tensor | None] = [None] * len(LLAMA_ALIGNED_HEADS)
+        for i, (layer, head) in enumerate(LLAMA_ALIGNED_HEADS):
+            tfmr.layers[layer].self_attn.register_forward_hook(
+                functools.partial(self._capture, i, head)
             )
-            return
+        # As the analyzer does: only eager attention returns the weights.
+        if getattr(tfmr.config, "_attn_implementation", None) == "sdpa":
+            tfmr.config._attn_implementation = "eager"
+        tfmr.config.output_attentions = True
 
-        assert _lock is not None
-        with _lock:
-            try:
-                wav = _model.generate(
-                    text=text,
-                    audio_prompt_path=AUDIO_PROMPT_PATH,
-                    cfg_weight=cfg_weight,
-                    exaggeration=exaggeration,
-                    language_id=language_id,
+    def _capture(self, i: int, head: int, module, args, output) -> None:
+        if isinstance(output, tuple) and len(output) > 1 and output[1] is not None:
+            self.attns[i] = output[1][0::2, head].cpu()  # (chunks, T0, Ti)
+
+    def feed(self, analyzer, row: int) -> None:
+        analyzer.last_aligned_attns = [a[row] for a in self.attns if a is not None]
+
+
+@functools.cache
+def _row_analyzer_class():
+    from chatterbox.models.t3.inference.alignment_stream_analyzer import (  # pyright: ignore[reportMissingImports]
+        AlignmentStreamAnalyzer,
+    )
+
+    class _RowAnalyzer(AlignmentStreamAnalyzer):
+        def _add_attention_spy(self, tfmr, buffer_idx, layer_idx, head_idx):
+            pass  # fed by _AlignmentSpy instead
+
+    return _RowAnalyzer
+
+
+class _T3Batch:
+    """T3 forward passes for a batch of chunks, two CFG rows per chunk.
+
+    Row 2i is chunk i conditioned on its text and row 2i+1 the same with the
+    text zeroed, as ``prepare_input_embeds`` builds them. Prompts of
+    different lengths are left-padded under an attention mask, with
+    position ids counting only real tokens, so every row sees what
+    ``T3.inference`` would feed it alone. ``logits`` holds the conditioned
+    and unconditioned speech logits of the last step, one row each.
+    """
+
+    def __init__(self, t3, chunks: list[_Chunk]) -> None:
+        global _alignment_spy
+
+        self._t3 = t3
+        self.device = t3.device
+        sos = torch.full(
+            (2, 1), t3.hp.start_speech_token, dtype=torch.long, device=self.device
+        )
+        # T3.inference appends a BOS embedding after the prompt's own
+        # start-of-speech token.
+        bos = t3.speech_emb(sos[:1]) + t3.speech_pos_emb.get_fixed_embedding(0)
+        prompts = []
+        text_slices = []
+        for chunk in chunks:
+            text_tokens = chunk.text_tokens.to(self.device)
+            embeds, len_cond = t3.prepare_input_embeds(
+                t3_cond=chunk.t3_cond,
+                text_tokens=text_tokens,
+                speech_tokens=sos,
+                cfg_weight=chunk.cfg_weight,
+            )
+            prompts.append(torch.cat([embeds, bos.expand(2, -1, -1)], dim=1))
+            text_slices.append((len_cond, len_cond + text_tokens.shape[-1]))
+
+        length = max(p.shape[1] for p in prompts)
+        inputs = prompts[0].new_zeros(len(prompts) * 2, length, prompts[0].shape[2])
+        self._mask = torch.zeros(
+            len(prompts) * 2, length, dtype=torch.long, device=self.device
+        )
+        self._analyzers = []
+        if t3.hp.is_multilingual and _alignment_spy is None:
+            _alignment_spy = _AlignmentSpy(t3.tfmr)
+        for i, (prompt, (start, end)) in enumerate(zip(prompts, text_slices)):
+            pad = length - prompt.shape[1]
+            inputs[2 * i : 2 * i + 2, pad:] = prompt
+            self._mask[2 * i : 2 * i + 2, pad:] = 1
+            if t3.hp.is_multilingual:
+                self._analyzers.append(
+                    _row_analyzer_class()(
+                        None,
+                        None,
+                        text_tokens_slice=(pad + start, pad + end),
+                        alignment_layer_idx=9,
+                        eos_idx=t3.hp.stop_speech_token,
+                    )
                 )
-            except Exception:
-                logging.getLogger().exception("generate failed")
-                self._json_error("generate error", 500)
+        self._positions = (self._mask.cumsum(dim=1) - 1).clamp(min=0)
+        self._past = None
+        self.logits = self._forward(inputs)
+
+    def _forward(self, inputs_embeds: torch.Tensor) -> torch.Tensor:
+        out = self._t3.tfmr(
+            inputs_embeds=inputs_embeds,
+            attention_mask=self._mask,
+            position_ids=self._positions[:, -inputs_embeds.shape[1] :],
+            past_key_values=self._past,
+            use_cache=True,
+            output_attentions=bool(self._analyzers),
+            output_hidden_states=True,
+            return_dict=True,
+        )
+        self._past = out.past_key_values
+        return self._t3.speech_head(out.hidden_states[-1][:, -1, :])
+
+    def guide(
+        self, scores: torch.Tensor, last_tokens: list[int], running: list[bool]
+    ) -> torch.Tensor:
+        """Apply each row's alignment checks (EOS suppression and forcing)."""
+        for i, analyzer in enumerate(self._analyzers):
+            if running[i]:
+                assert _alignment_spy is not None
+                _alignment_spy.feed(analyzer, i)
+                scores[i : i + 1] = analyzer.step(
+                    scores[i : i + 1], next_token=last_tokens[i]
+                )
+        return scores
+
+    def step(self, next_tokens: torch.Tensor, position: int) -> torch.Tensor:
+        """Feed each chunk's sampled token (``(chunks, 1)``) to both its rows."""
+        embeds = self._t3.speech_emb(next_tokens)
+        embeds = embeds + self._t3.speech_pos_emb.get_fixed_embedding(position)
+        self._mask = torch.nn.functional.pad(self._mask, (0, 1), value=1)
+        self._positions = self._positions[:, -1:] + 1
+        self.logits = self._forward(embeds.repeat_interleave(2, dim=0))
+        return self.logits
+
+
+def _decode_speech_tokens(chunks: list[_Chunk]) -> list[torch.Tensor | None]:
+    """Sample speech tokens for ``chunks`` with one T3 pass per step.
+
+    The sampling is ``T3.inference``'s (CFG, the multilingual alignment
+    checks, repetition penalty, temperature, min_p), run over every chunk
+    at once. A row is done at its stop token or token budget; a row whose
+    job is cancelled stops early and comes back as None. The loop ends when
+    every row is done, so a batch costs about as many steps as its longest
+    chunk.
+    """
+    t3 = _model.t3
+    stop = t3.hp.stop_speech_token
+    budgets = [_speech_token_budget(c.text_tokens.shape[-1]) for c in chunks]
+    if isinstance(_model, _FakeModel):
+        batch = _FakeT3Batch(_model, chunks)
+    else:
+        batch = _T3Batch(t3, chunks)
+    cfg = torch.tensor(
+        [float(c.cfg_weight) for c in chunks], device=batch.device
+    ).unsqueeze(1)
+    ids = torch.full(
+        (len(chunks), 1),
+        t3.hp.start_speech_token,
+        dtype=torch.long,
+        device=batch.device,
+    )
+    last = [t3.hp.start_speech_token] * len(chunks)
+    generated: list[list[int]] = [[] for _ in chunks]
+    running = [True] * len(chunks)
+    cancelled = [False] * len(chunks)
+    logits = batch.logits
+    for step in range(max(budgets)):
+        for i, chunk in enumerate(chunks):
+            if running[i] and chunk.cancelled:
+                running[i] = False
+                cancelled[i] = True
+        if not any(running):
+            break
+        cond, uncond = logits[0::2], logits[1::2]
+        scores = batch.guide(cond + cfg * (cond - uncond), last, running)
+        scores = _repetition_penalty(ids, scores, T3_REPETITION_PENALTY)
+        scores = _min_p(scores / T3_TEMPERATURE, T3_MIN_P)
+        next_tokens = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)
+        ids = torch.cat([ids, next_tokens], dim=1)
+        last = next_tokens.view(-1).tolist()
+        for i, token in enumerate(last):
+            if running[i]:
+                generated[i].append(token)
+                running[i] = token != stop and len(generated[i]) < budgets[i]
+        if not any(running):
+            break
+        logits = batch.step(next_tokens, step + 1)
+    return [
+        None if cancelled[i] else torch.tensor(tokens, dtype=torch.long)
+        for i, tokens in enumerate(generated)
+    ]
+
+
+def _synthesize_batch(chunks: list[_Chunk]) -> list[torch.Tensor | None]:
+    """Run T3 for ``chunks`` together, then S3Gen for each chunk.
+
+    Waveforms stay on the device; a chunk whose job was cancelled comes back
+    as None. S3Gen stays one chunk at a time: it is a small share of the
+    time next to T3's token-by-token decode.
+    """
+    if isinstance(_model, _FakeModel):
+        drop_invalid_tokens = _model.drop_invalid_tokens
+    else:
+        from chatterbox.models.s3tokenizer import (  # pyright: ignore[reportMissingImports]
+            drop_invalid_tokens,
+        )
+
+    log = logging.getLogger(__name__)
+    wavs: list[torch.Tensor | None] = []
+    with torch.inference_mode():
+        for chunk, speech_tokens in zip(chunks, _decode_speech_tokens(chunks)):
+            if speech_tokens is None or chunk.cancelled:
+                wavs.append(None)
+                continue
+            budget = _speech_token_budget(chunk.text_tokens.shape[-1])
+            if speech_tokens.shape[-1] >= budget:
+                # Never reached the stop token; whatever it was saying past
+                # the text is cut off with the budget.
+                _metrics.length_guard.inc("token_budget")
+                log.warning(
+                    "Speech token budget (%d) exhausted for %d text tokens",
+                    budget,
+                    chunk.text_tokens.shape[-1],
+                )
+            speech_tokens = drop_invalid_tokens(speech_tokens).to(_model.device)
+            cut = _trailing_repeat_start(speech_tokens)
+            if cut is not None:
+                _metrics.length_guard.inc("trailing_repeat")
+                speech_tokens = speech_tokens[:cut]
+            wav, _ = _model.s3gen.inference(
+                speech_tokens=speech_tokens, ref_dict=chunk.conds.gen
+            )
+            wavs.append(wav)
+    return wavs
+
+
+def _finish_chunk(wav: torch.Tensor) -> np.ndarray:
+    """Copy a chunk off the device and watermark it, on the CPU pool."""
+    samples = wav.squeeze(0).detach().cpu().numpy()
+    samples = _model.watermarker.apply_watermark(samples, sample_rate=_model.sr)
+    return np.asarray(samples, dtype=np.float32)
+
+
+def _stitch(job: _Job, pieces: list[concurrent.futures.Future]) -> None:
+    started = time.monotonic()
+    try:
+        samples = _crossfade_concat(
+            [p.result() for p in pieces], int(CROSSFADE_SECS * SAMPLE_RATE)
+        )
+        if _postprocess_enabled:
+            samples = _postprocess(samples, job.trim_start, job.trim_end)
+    except Exception as e:
+        logging.getLogger().exception("post-processing failed")
+        _metrics.errors.inc()
+        _resolve(job, None, e)
+        return
+    job.post_secs = time.monotonic() - started
+    audio_secs = len(samples) / SAMPLE_RATE
+    _metrics.synthesis.observe(job.gpu_secs)
+    _metrics.audio.observe(audio_secs)
+    if audio_secs > 0:
+        _metrics.rtf.observe(job.gpu_secs / audio_secs)
+    _resolve(job, _pcm16(samples), None)
+
+
+def _generate_batch(batch: list[_Job], record) -> None:
+    """Generate ``batch`` together, one chunk of every job per round.
+
+    Jobs arrive split into bounded chunks already being tokenized by
+    ``_preprocess``. Each round decodes the next chunk of every job still
+    going as one batch (see _decode_speech_tokens). While the GPU runs round
+    N the CPU pool copies out/watermarks round N-1, and a job is
+    crossfaded, post-processed and converted to PCM16 as soon as its last
+    chunk is off the GPU, without waiting for the rest of the batch. A job's
+    ``gpu_secs`` is the time of the rounds it was part of.
+
+    ``record`` gets the batch's decode time per job that was decoded, and
+    is not called at all if nothing reached the GPU (every job expired,
+    failed conditioning or was cancelled first), which would otherwise
+    drag the average toward zero.
+    """
+    assert _voices is not None and _cpu_pool is not None
+    log = logging.getLogger()
+    live: dict[_Job, tuple[object, object]] = {}
+    for job in batch:
+        if job.expires is not None and job.expires <= time.monotonic():
+            _metrics.deadline_dropped.inc("taken")
+            _resolve(job, None, DeadlineExceededError("expired before decoding"))
+            continue
+        try:
+            conds = _voices.get(job.voice_id)
+            live[job] = (conds, _t3_cond(conds, job.exaggeration))
+        except Exception as e:
+            log.exception("voice conditioning failed")
+            _metrics.errors.inc()
+            _resolve(job, None, e)
+            continue
+        job.wait_secs = time.monotonic() - job.submitted
+        _metrics.queue_wait.observe(job.wait_secs)
+
+    pieces: dict[_Job, list[concurrent.futures.Future]] = {job: [] for job in live}
+    decoded: set[_Job] = set()
+    gpu_secs = 0.0
+    index = 0
+    try:
+        while live:
+            chunks = []
+            for job, (conds, t3_cond) in list(live.items()):
+                if job.cancelled:
+                    _metrics.cancelled.inc("between_chunks")
+                    del live[job]
+                    continue
+                try:
+                    tokens = job.chunks[index].result()
+                except Exception as e:
+                    log.exception("tokenization failed")
+                    _metrics.errors.inc()
+                    _resolve(job, None, e)
+                    del live[job]
+                    continue
+                chunks.append(_Chunk(conds, t3_cond, tokens, job.cfg_weight, job))
+            if not chunks:
+                break
+            started = time.monotonic()
+            try:
+                wavs: list = _synthesize_batch(chunks)
+            except Exception as e:
+                log.exception("generate failed")
+                wavs = [e] * len(chunks)
+            elapsed = time.monotonic() - started
+            gpu_secs += elapsed
+            for chunk, wav in zip(chunks, wavs):
+                job = chunk.job
+                assert job is not None
+                decoded.add(job)
+                job.gpu_secs += elapsed
+                if isinstance(wav, Exception):
+                    _metrics.errors.inc()
+                    _resolve(job, None, wav)
+                    del live[job]
+                elif wav is None:
+                    _metrics.cancelled.inc("decoding")
+                    del live[job]
+                else:
+                    pieces[job].append(_cpu_pool.submit(_finish_chunk, wav))
+                    if index == len(job.chunks) - 1:
+                        del live[job]
+                        _cpu_pool.submit(_stitch, job, pieces[job])
+            index += 1
+    finally:
+        if decoded:
+            record(gpu_secs / len(decoded))
+
+
+class _RequestError(Exception):
+    def __init__(self, message: str, status: int, **extra: float) -> None:
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def _frame(kind: bytes, payload: bytes) -> bytes:
+    return _FRAME_HEADER.pack(kind, len(payload)) + payload
+
+
+def _json_frame(kind: bytes, obj: dict) -> bytes:
+    return _frame(kind, json.dumps(obj).encode())
+
+
+async def handle_metrics(request: aiohttp.web.Request) -> aiohttp.web.Response:
+    assert _scheduler is not None
+    status = _scheduler.status()
+    body = _metrics.render(
+        {
+            "chatterbox_queue_depth": status["queue_depth"],
+            "chatterbox_running_jobs": status["running"],
+            "chatterbox_queue_capacity": status["queue_capacity"],
+        }
+    )
+    return aiohttp.web.Response(
+        text=body, headers={"Content-Type": "text/plain; version=0.0.4"}
+    )
+
+
+async def handle_health(request: aiohttp.web.Request) -> aiohttp.web.Response:
+    assert _scheduler is not None and _voices is not None
+    return aiohttp.web.json_response({**_scheduler.status(), **_voices.status()})
+
+
+def _non_negative(req: dict, name: str, default: float) -> float:
+    value = req.get(name, default)
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, (int, float))
+        or not math.isfinite(value)
+        or value < 0
+    ):
+        raise _RequestError(f"{name} must be a non-negative number", 400)
+    return float(value)
+
+
+def _make_jobs(req: dict) -> list[_Job]:
+    """Validate a generate request and turn it into scheduler jobs."""
+    text = req.get("text", "")
+    language_id = req.get("language_id", "en")
+    if (
+        not isinstance(language_id, str)
+        or language_id.lower() not in _text_frontend()[0]
+    ):
+        raise _RequestError(f"unsupported language_id: {language_id!r}", 400)
+    language_id = language_id.lower()
+    cfg_weight = _non_negative(req, "cfg_weight", 0.5)
+    exaggeration = _non_negative(req, "exaggeration", 0.5)
+    voice_id = req.get("voice_id") or None
+    try:
+        priority = int(req.get("priority", 0))
+    except (TypeError, ValueError):
+        raise _RequestError("priority must be an integer", 400)
+    expires = None
+    if req.get("deadline") is not None:
+        try:
+            # The deadline is wall-clock; queue bookkeeping is monotonic.
+            expires = time.monotonic() + float(req["deadline"]) - time.time()
+        except (TypeError, ValueError):
+            raise _RequestError("deadline must be a unix timestamp", 400)
+
+    try:
+        prompt_path = _voice_path(voice_id)
+    except ValueError as e:
+        raise _RequestError(str(e), 400)
+    if voice_id and not os.path.exists(prompt_path):
+        raise _RequestError(f"unknown voice: {voice_id}", 404)
+    if not os.path.exists(prompt_path):
+        raise _RequestError(
+            f"Audio prompt not found at {AUDIO_PROMPT_PATH}. "
+            "Run `modal run chatterbox_runner.py::upload_to_clone` first.",
+            500,
+        )
+
+    loop = asyncio.get_running_loop()
+    segments = _split_text(text) if req.get("stream") else [text]
+    jobs = [
+        _Job(
+            text=segment,
+            language_id=language_id,
+            cfg_weight=cfg_weight,
+            exaggeration=exaggeration,
+            voice_id=voice_id,
+            future=loop.create_future(),
+            priority=priority,
+            trim_start=i == 0,
+            trim_end=i == len(segments) - 1,
+            expires=expires,
+            index=i,
+        )
+        for i, segment in enumerate(segments)
+    ]
+    for job in jobs[1:]:
+        job.head = jobs[0]
+    return jobs
+
+
+def _submit(req: dict) -> list[_Job]:
+    """Validate ``req`` and queue its jobs, refusals raised as _RequestError."""
+    if not isinstance(req, dict):
+        raise _RequestError("request must be a JSON object", 400)
+    jobs = _make_jobs(req)
+    assert _scheduler is not None
+    _preprocess(jobs)
+    try:
+        _scheduler.submit(jobs)
+    except (QueueFullError, DeadlineExceededError) as e:
+        for job in jobs:
+            for tokens in job.chunks:
+                tokens.cancel()
+        if isinstance(e, QueueFullError):
+            raise _RequestError("queue full", 503, retry_after=e.retry_after)
+        raise _RequestError(f"deadline exceeded: {e}", 504)
+    return jobs
+
+
+async def _segment_pcm(job: _Job) -> bytes:
+    try:
+        return await job.future
+    except DeadlineExceededError as e:
+        raise _RequestError(f"deadline exceeded: {e}", 504)
+    except Exception:
+        raise _RequestError("generate error", 500)
+
+
+async def _serve_generate(payload: bytes, writer: asyncio.StreamWriter) -> None:
+    """Answer one framed generate request.
+
+    Every segment is queued up front so the GPU never waits on the socket,
+    then written as an audio frame, in order, as it finishes. A failure
+    after the first frame is still reported with an error frame; the client
+    discards what it has received.
+
+    The end trailer carries stage timings in seconds: ``queue`` until the
+    first segment started decoding, ``inference`` and ``postprocess``
+    summed over segments, and ``total`` for the whole request.
+    """
+    started = time.monotonic()
+    try:
+        req = json.loads(payload)
+    except ValueError:
+        raise _RequestError("invalid json", 400)
+    jobs = _submit(req)
+    assert _scheduler is not None
+    try:
+        for job in jobs:
+            writer.write(_frame(FRAME_AUDIO, await _segment_pcm(job)))
+            await writer.drain()
+    finally:
+        # Covers the client going away (this task is cancelled) and a later
+        # segment failing; either way the rest is wasted GPU time.
+        _scheduler.cancel(jobs)
+    timings = {
+        "queue": jobs[0].wait_secs,
+        "inference": sum(job.gpu_secs for job in jobs),
+        "postprocess": sum(job.post_secs for job in jobs),
+        "total": time.monotonic() - started,
+    }
+    writer.write(
+        _json_frame(
+            FRAME_END,
+            {"sample_rate": SAMPLE_RATE, "segments": len(jobs), "timings": timings},
+        )
+    )
+    await writer.drain()
+
+
+async def _handle_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Serve generate requests on one persistent socket connection, in turn.
+
+    A request is a big-endian u32 length and that many bytes of JSON. The
+    reply is a sequence of frames (type byte, u32 length, payload): one
+    ``FRAME_AUDIO`` of PCM16 per segment, then ``FRAME_END`` with a JSON
+    trailer, or ``FRAME_ERROR`` with ``{"error", "status", ...}``.
+    """
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(_REQUEST_HEADER.size)
+            except asyncio.IncompleteReadError:
                 return
+            (length,) = _REQUEST_HEADER.unpack(header)
+            payload = await reader.readexactly(length)
+
+            started = time.monotonic()
+            status = "error"
+            work = asyncio.ensure_future(_serve_generate(payload, writer))
+            # The client sends nothing until the reply is complete, so
+            # anything readable now means it hung up.
+            gone = asyncio.ensure_future(reader.read(1))
+            try:
+                await asyncio.wait({work, gone}, return_when=asyncio.FIRST_COMPLETED)
+                if not work.done():
+                    status = "cancelled"
+                    work.cancel()
+                    await asyncio.gather(work, return_exceptions=True)
+                    return
+                try:
+                    work.result()
+                    status = "200"
+                except _RequestError as e:
+                    status = str(e.status)
+                    writer.write(
+                        _json_frame(
+                            FRAME_ERROR,
+                            {"error": str(e), "status": e.status, **e.extra},
+                        )
+                    )
+                    await writer.drain()
+                if gone.done():
+                    return
+            finally:
+                # Wait for the read to unwind; the reader takes one waiter.
+                gone.cancel()
+                await asyncio.gather(gone, return_exceptions=True)
+                _metrics.requests.inc(status)
+                _metrics.request_seconds.observe(time.monotonic() - started)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception:
+        logging.getLogger().exception("generate connection failed")
+    finally:
+        writer.close()
+
+
+def _json_error(e: _RequestError) -> aiohttp.web.Response:
+    headers = {}
+    if "retry_after" in e.extra:
+        headers["Retry-After"] = str(max(1, math.ceil(e.extra["retry_after"])))
+    return aiohttp.web.json_response(
+        {"error": str(e)}, status=e.status, headers=headers
+    )
+
+
+def _wav(pcm: bytes) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(pcm)
+    return buffer.getvalue()
+
+
+async def handle_generate(request: aiohttp.web.Request) -> aiohttp.web.StreamResponse:
+    """Generate over HTTP, for callers without the socket (the CPU tier).
+
+    The body is the socket's JSON request, plus ``response_format``:
+    ``"wav"`` (the default) or ``"pcm16"``. With ``"stream": true`` the reply
+    is chunked ``audio/pcm``, one HTTP chunk per segment as it finishes; a
+    failure after the first chunk drops the connection, so the client sees
+    a truncated body. Errors are ``{"error": ...}`` with the socket's
+    statuses, and a 503 carries ``Retry-After``.
+    """
+    started = time.monotonic()
+    status = "error"
+    try:
+        resp = await _generate_http(request)
+        status = str(resp.status)
+        return resp
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        _metrics.requests.inc(status)
+        _metrics.request_seconds.observe(time.monotonic() - started)
+
+
+async def _generate_http(request: aiohttp.web.Request) -> aiohttp.web.StreamResponse:
+    try:
+        req = await request.json()
+    except ValueError:
+        return _json_error(_RequestError("invalid json", 400))
+    if not isinstance(req, dict):
+        return _json_error(_RequestError("request must be a JSON object", 400))
+    response_format = req.get("response_format", "wav")
+    if response_format not in ("wav", "pcm16"):
+        return _json_error(
+            _RequestError(f"unsupported response_format: {response_format}", 400)
+        )
+    try:
+        jobs = _submit(req)
+    except _RequestError as e:
+        return _json_error(e)
+    assert _scheduler is not None
+    try:
+        try:
+            first = await _segment_pcm(jobs[0])
+        except _RequestError as e:
+            return _json_error(e)
+        if not req.get("stream"):
+            body = first if response_format == "pcm16" else _wav(first)
+            return aiohttp.web.Response(
+                body=body,
+                content_type="audio/pcm" if response_format == "pcm16" else "audio/wav",
+                headers={"X-Sample-Rate": str(SAMPLE_RATE)},
+            )
+        resp = aiohttp.web.StreamResponse(
+            headers={"X-Sample-Rate": str(SAMPLE_RATE), "X-Segments": str(len(jobs))}
+        )
+        resp.content_type = "audio/pcm"
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        await resp.write(first)
+        for job in jobs[1:]:
+            await resp.write(await _segment_pcm(job))
+        await resp.write_eof()
+        return resp
+    finally:
+        # Covers the client going away (the handler is cancelled) and a
+        # stream failing part way; either way the rest is wasted GPU time.
+        _scheduler.cancel(jobs)
+
+
+def _quantize_int8(model) -> None:
+    """Dynamically quantize the T3 backbone's Linear layers to int8.
+
+    Only the Llama transformer is converted: it dominates CPU time, and T3
+    reads ``speech_head.weight`` directly, which a quantized Linear no longer
+    exposes as a tensor.
+    """
+    if str(model.device) != "cpu":
+        raise ValueError("int8 dynamic quantization is only supported on CPU")
+    model.t3.tfmr = torch.ao.quantization.quantize_dynamic(
+        model.t3.tfmr, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+class _FakeModel:
+    """Stand-in for ChatterboxMultilingualTTS with no weights and no GPU.
+
+    It has the attributes the pipeline touches, so everything around the
+    model (socket, scheduler, cancellation, stitching, post-processing)
+    runs for real. T3 (see _FakeT3Batch) emits FAKE_SPEECH_TOKENS_PER_CHAR
+    tokens per input character and S3Gen renders a deterministic tone at
+    S3Gen's 25 tokens per second. The two sleep so that a lone chunk is
+    synthesized at ``rtf`` seconds per second of audio. Nothing on this
+    path imports chatterbox: the conditionals are placeholders that are
+    never persisted, and the text helpers below stand in for its own.
+    """
+
+    # The ids chatterbox.mtl_tts.SUPPORTED_LANGUAGES accepts.
+    SUPPORTED_LANGUAGES = frozenset(
+        "ar da de el en es fi fr he hi it ja ko ms nl no pl pt ru sv sw tr zh".split()
+    )
+    FAKE_SPEECH_TOKENS_PER_CHAR = 2
+    SAMPLES_PER_TOKEN = SAMPLE_RATE // 25
+
+    def __init__(self, rtf: float) -> None:
+        import types
+
+        secs_per_token = rtf * self.SAMPLES_PER_TOKEN / SAMPLE_RATE
+        self.device = torch.device("cpu")
+        self.sr = SAMPLE_RATE
+        self.conds = None
+        self.tokenizer = types.SimpleNamespace(text_to_tokens=self._text_to_tokens)
+        self.t3 = types.SimpleNamespace(
+            hp=types.SimpleNamespace(
+                start_text_token=255,
+                stop_text_token=0,
+                start_speech_token=6561,
+                stop_speech_token=6562,
+                is_multilingual=False,
+            )
+        )
+        self.s3gen = types.SimpleNamespace(inference=self._s3gen_inference)
+        self.watermarker = types.SimpleNamespace(
+            apply_watermark=lambda wav, sample_rate: wav
+        )
+        # Most of the real time is T3's autoregressive decode.
+        self._t3_secs_per_token = 0.8 * secs_per_token
+        self._s3gen_secs_per_token = 0.2 * secs_per_token
+
+    @staticmethod
+    def punc_norm(text: str) -> str:
+        return " ".join(text.split()) or "You need to add some text for me to talk."
+
+    def drop_invalid_tokens(self, tokens: torch.Tensor) -> torch.Tensor:
+        return tokens[tokens < self.t3.hp.start_speech_token]
+
+    @staticmethod
+    def _text_to_tokens(text: str, language_id: str | None = None) -> torch.Tensor:
+        return torch.tensor([[ord(c) % 700 + 1 for c in text]])
+
+    def _s3gen_inference(
+        self, speech_tokens: torch.Tensor, ref_dict: dict
+    ) -> tuple[torch.Tensor, None]:
+        n = speech_tokens.shape[-1]
+        time.sleep(n * self._s3gen_secs_per_token)
+        t = torch.arange(n * self.SAMPLES_PER_TOKEN) / SAMPLE_RATE
+        return (0.3 * torch.sin(2 * math.pi * 220.0 * t)).unsqueeze(0), None
+
+    def prepare_conditionals(self, wav_fpath: str) -> None:
+        import types
+
+        self.conds = types.SimpleNamespace(
+            t3=types.SimpleNamespace(emotion_adv=0.5 * torch.ones(1, 1, 1)), gen={}
+        )
+
+
+class _FakeT3Batch:
+    """_T3Batch for _FakeModel: every row's logits pick its next fake token.
+
+    A step sleeps once for the whole batch, as a batched decode step costs
+    about what a single row's does.
+    """
+
+    def __init__(self, model: _FakeModel, chunks: list[_Chunk]) -> None:
+        self.device = model.device
+        self._secs_per_step = model._t3_secs_per_token
+        self._lengths = torch.tensor(
+            [
+                (c.text_tokens.shape[-1] - 2) * model.FAKE_SPEECH_TOKENS_PER_CHAR
+                for c in chunks
+            ]
+        ).repeat_interleave(2)
+        self.logits = self.step(None, 0)
+
+    def guide(
+        self, scores: torch.Tensor, last_tokens: list[int], running: list[bool]
+    ) -> torch.Tensor:
+        return scores
+
+    def step(self, next_tokens: torch.Tensor | None, position: int) -> torch.Tensor:
+        time.sleep(self._secs_per_step)
+        tokens = torch.where(self._lengths > position, position % 6561, 6562)
+        logits = torch.full((len(tokens), 8194), -1e4)
+        self.logits = logits.scatter(1, tokens.unsqueeze(1), 1e4)
+        return self.logits
+
+
+def _materialize_weights(weights_dir: str) -> None:
+    """Copy the multilingual checkpoint out of the HF cache into ``weights_dir``.
+
+    ``from_pretrained`` fetches exactly the files ``from_local`` needs, so
+    the snapshot it leaves behind is copied as is; the marker file is
+    written last so a half-copied directory is never used.
+    """
+    import shutil
+
+    from chatterbox.mtl_tts import (  # pyright: ignore[reportMissingImports]
+        REPO_ID,
+        ChatterboxMultilingualTTS,
+    )
+    from huggingface_hub import (  # pyright: ignore[reportMissingImports]
+        snapshot_download,
+    )
+
+    log = logging.getLogger(__name__)
+    ChatterboxMultilingualTTS.from_pretrained(device="cpu")
+    snapshot = snapshot_download(repo_id=REPO_ID, local_files_only=True)
+    marker = os.path.join(weights_dir, WEIGHTS_COMPLETE_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+    os.makedirs(weights_dir, exist_ok=True)
+    for name in sorted(os.listdir(snapshot)):
+        src = os.path.join(snapshot, name)
+        if not os.path.isfile(src):
+            continue
+        tmp = os.path.join(weights_dir, f"{name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(src, tmp)  # follows the cache's symlinks to the blobs
+        os.replace(tmp, os.path.join(weights_dir, name))
+        log.info("Materialized %s (%.1f MB)", name, os.path.getsize(src) / 1e6)
+    with open(marker, "w"):
+        pass
+    log.info("Chatterbox weights materialized in %s", weights_dir)
+
+
+def _load_model(
+    device: str = "auto",
+    quantize: str = "none",
+    threads: int | None = None,
+    interop_threads: int | None = None,
+    weights_dir: str | None = None,
+    phases: dict[str, float] | None = None,
+):
+    """Load Chatterbox for ``device`` ("auto", "cuda" or "cpu").
+
+    Thread counts must be applied before torch runs any parallel work, so
+    this is the first thing the subscript does with torch.
 
-        sample_rate = 24000
-        buffer = io.BytesIO()
-        soundfile.write(buffer, wav[0].cpu().numpy(), sample_rate, format="wav")
-        wav_bytes = buffer.getvalue()
-        self.send_response(200)
-        self.send_header("Content-Type", "audio/wav")
-        self.send_header("Content-Length", str(len(wav_bytes)))
-        self.end_headers()
-        self.wfile.write(wav_bytes)
+    If ``weights_dir`` holds materialized weights they are loaded with
+    ``from_local`` onto the CPU and then moved to ``device``, skipping the
+    hub lookup; otherwise this falls back to ``from_pretrained``. Seconds
+    spent importing, loading, moving and quantizing are added to
+    ``phases``.
+    """
+    if phases is None:
+        phases = {}
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        torch.set_num_interop_threads(interop_threads)
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    started = time.monotonic()
+    from chatterbox.mtl_tts import (  # pyright: ignore[reportMissingImports]
+        ChatterboxMultilingualTTS,
+    )
+
+    phases["imports"] = time.monotonic() - started
+    log = logging.getLogger(__name__)
+    log.info(
+        "Loading ChatterboxMultilingualTTS on %s (quantize=%s, threads=%d/%d)...",
+        device,
+        quantize,
+        torch.get_num_threads(),
+        torch.get_num_interop_threads(),
+    )
+    started = time.monotonic()
+    if weights_dir and os.path.exists(
+        os.path.join(weights_dir, WEIGHTS_COMPLETE_MARKER)
+    ):
+        log.info("Loading materialized weights from %s", weights_dir)
+        model = ChatterboxMultilingualTTS.from_local(weights_dir, "cpu")
+        phases["weights"] = time.monotonic() - started
+        started = time.monotonic()
+        if device != "cpu":
+            for module in (model.t3, model.s3gen, model.ve):
+                module.to(device)
+            if model.conds is not None:
+                model.conds = model.conds.to(device)
+            model.device = device
+        phases["device"] = time.monotonic() - started
+    else:
+        log.info(
+            "No materialized weights, loading through the HF cache "
+            "(run --materialize-weights to skip this)"
+        )
+        model = ChatterboxMultilingualTTS.from_pretrained(device=device)
+        # from_pretrained moves each module as it loads it.
+        phases["weights"] = time.monotonic() - started
+    if quantize == "int8":
+        started = time.monotonic()
+        _quantize_int8(model)
+        phases["quantize"] = time.monotonic() - started
+    log.info("Chatterbox model loaded on %s", device)
+    return model
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="HTTP bind address; 0.0.0.0 to serve /generate off the box",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8765, help="/health, /metrics, /generate"
+    )
+    parser.add_argument("--socket", default=SOCKET_PATH, help="generate requests")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE_DEPTH)
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help="Jobs decoded together in one batched T3 pass.",
+    )
+    parser.add_argument("--voice-cache-size", type=int, default=VOICE_CACHE_SIZE)
+    parser.add_argument("--device", choices=["auto", "cuda", "cpu"], default="auto")
+    parser.add_argument(
+        "--quantize",
+        choices=["none", "int8"],
+        default="none",
+        help="int8: dynamic quantization of the T3 Linear layers (CPU only).",
+    )
+    parser.add_argument("--threads", type=int, help="torch intra-op threads")
+    parser.add_argument("--interop-threads", type=int, help="torch inter-op threads")
+    parser.add_argument(
+        "--postprocess",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Trim silence, normalize loudness and fade out generated audio.",
+    )
+    parser.add_argument(
+        "--speech-token-ratio",
+        type=float,
+        default=SPEECH_TOKENS_PER_TEXT_TOKEN,
+        help="Speech tokens T3 may generate per text token of a chunk.",
+    )
+    parser.add_argument(
+        "--max-speech-tokens",
+        type=int,
+        default=MAX_NEW_SPEECH_TOKENS,
+        help="Hard ceiling on speech tokens per chunk (25 per second of audio).",
+    )
+    parser.add_argument(
+        "--fake-model",
+        action="store_true",
+        help="Serve with a fake model that sleeps instead of running "
+        "Chatterbox, for load-testing the serving layer.",
+    )
+    parser.add_argument(
+        "--fake-rtf",
+        type=float,
+        default=0.3,
+        help="Fake model synthesis seconds per second of audio.",
+    )
+    parser.add_argument(
+        "--weights-dir",
+        default=WEIGHTS_DIR,
+        help="Materialized checkpoint to load instead of the HF cache.",
+    )
+    parser.add_argument(
+        "--materialize-weights",
+        action="store_true",
+        help="Copy the checkpoint from the HF cache into --weights-dir, then exit.",
+    )
+    parser.add_argument(
+        "--prepare-voice",
+        nargs="?",
+        const="",
+        metavar="VOICE_ID",
+        help="Build and persist the conditionals for a voice "
+        "(default: the cloned voice), then exit.",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -114,29 +1795,93 @@ def main() -> None:
 
     os.makedirs(HF_CACHE_DIR, exist_ok=True)
 
-    from chatterbox.mtl_tts import (  # pyright: ignore[reportMissingImports]
-        ChatterboxMultilingualTTS,
-    )
+    if args.materialize_weights:
+        _materialize_weights(args.weights_dir)
+        return
 
-    global _lock, _model
-    _lock = threading.Lock()
+    global _scheduler, _model, _voices, _cpu_pool, _preprocess_pool
+    global _postprocess_enabled
+    global _speech_token_ratio, _max_speech_tokens
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    log.info("Loading ChatterboxMultilingualTTS on %s...", device)
-    _model = ChatterboxMultilingualTTS.from_pretrained(device=device)
-    log.info("Chatterbox model loaded on %s", device)
+    _postprocess_enabled = args.postprocess
+    _speech_token_ratio = args.speech_token_ratio
+    _max_speech_tokens = args.max_speech_tokens
 
-    server = http.server.ThreadingHTTPServer(
-        ("127.0.0.1", args.port), _Handler
+    startup = time.monotonic()
+    phases: dict[str, float] = {}
+    if args.fake_model:
+        log.info("Using the fake model (rtf %.2f)", args.fake_rtf)
+        _model = _FakeModel(args.fake_rtf)
+    else:
+        _model = _load_model(
+            args.device,
+            args.quantize,
+            args.threads,
+            args.interop_threads,
+            weights_dir=args.weights_dir,
+            phases=phases,
+        )
+
+    _voices = _VoiceRegistry(args.voice_cache_size)
+    if args.prepare_voice is not None:
+        path = _voice_path(args.prepare_voice)
+        if not os.path.exists(path):
+            log.error("Audio prompt not found at %s", path)
+            sys.exit(1)
+        _voices.get(args.prepare_voice)
+        return
+    if os.path.exists(AUDIO_PROMPT_PATH):
+        started = time.monotonic()
+        _model.conds = _voices.get(None)
+        phases["voice"] = time.monotonic() - started
+    if _model.conds is not None:
+        # The first pass pays for CUDA context setup and kernel selection;
+        # keep that out of the first request and visible in the log.
+        started = time.monotonic()
+        _synthesize_batch(
+            [_Chunk(_model.conds, _model.conds.t3, _tokenize("Hello.", "en"), 0.5)]
+        )
+        phases["first_inference"] = time.monotonic() - started
+    log.info(
+        "Startup took %.2fs: %s",
+        time.monotonic() - startup,
+        ", ".join(f"{name} {secs:.2f}s" for name, secs in phases.items()),
     )
-    log.info("chatterbox subscript listening on 127.0.0.1:%d", args.port)
 
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        pass
-    finally:
-        server.server_close()
+    _cpu_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=2, thread_name_prefix="chatterbox-cpu"
+    )
+    # Separate from _cpu_pool so tokenizing the next request never queues
+    # behind post-processing of the last one.
+    _preprocess_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="chatterbox-preprocess"
+    )
+    _scheduler = _Scheduler(args.max_batch, args.max_queue)
+    threading.Thread(target=_scheduler.run, daemon=True).start()
+
+    async def _serve_socket(app: aiohttp.web.Application):
+        # Started before the HTTP site, so /health answering means the socket
+        # is accepting too.
+        server = await asyncio.start_unix_server(_handle_connection, args.socket)
+        log.info("chatterbox subscript serving generate on %s", args.socket)
+        yield
+        server.close()
+        await server.wait_closed()
+
+    app = aiohttp.web.Application()
+    app.cleanup_ctx.append(_serve_socket)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_post("/generate", handle_generate)
+    log.info("chatterbox subscript listening on %s:%d", args.host, args.port)
+    aiohttp.web.run_app(
+        app,
+        host=args.host,
+        port=args.port,
+        print=None,
+        access_log=None,
+        handler_cancellation=True,
+    )
 
 
 if __name__ == "__main__":
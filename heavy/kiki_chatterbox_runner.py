@@ -4,16 +4,23 @@
 from __future__ import annotations
 
 import asyncio
+import collections
+import hashlib
 import json
 import logging
+import math
 import os
 import outputguard
+import struct
 import subprocess
 import sys
 import threading
 import time
-import urllib.request
+import unicodedata
+import uuid
+from contextlib import aclosing
 from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, NoReturn
 
 import aiohttp
 import modal
@@ -136,8 +143,22 @@ def install_bus_logging(prefix: str = "") -> None:
 KIKI_MODEL_DIR = "/models"
 CHATTERBOX_MODEL_DIR = "/chatterbox_models"
 AUDIO_PROMPT_PATH = os.path.join(CHATTERBOX_MODEL_DIR, "to_clone.wav")
+CHATTERBOX_VOICES_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "voices")
+# A registry voice id, checked in full on upload and on every request.
+VOICE_ID_PATTERN = r"[A-Za-z0-9_-]{1,64}"
+TTS_CACHE_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "tts_cache")
+TTS_CACHE_MEMORY_BYTES = 128 * 1024 * 1024
+TTS_CACHE_DISK_BYTES = 2 * 1024 * 1024 * 1024
+# Bump when the audio for the same request changes (model, post-processing,
+# encoding), so entries from older containers are no longer served.
+TTS_CACHE_VERSION = 1
+# How stale the container's view of the volume may get, and how soon to look
+# again for a voice that isn't there (it may have just been uploaded).
+VOLUME_RELOAD_SECS = 60.0
+VOLUME_MISS_RELOAD_SECS = 5.0
 HF_CACHE_DIR = os.path.join(CHATTERBOX_MODEL_DIR, "huggingface")
 MINUTES = 60
+SAMPLE_RATE = 24000
 PORT = 8000
 AUDIO_PORT = 8000
 KIKI_WEB_PORT = 9124
@@ -145,10 +166,97 @@ TIMEOUT_SECS = 240.0
 KIKI_TIMEOUT_SECS = 60.0
 KIKI_MODEL_NAME = "kikiv2"
 KIKI_MAX_RETRIES = 3
+# Reactions to identical messages (copypasta, bot spam) are shared.
+KIKI_CACHE_SIZE = 512
+KIKI_CACHE_TTL_SECS = 120.0
 CHATTERBOX_SUBPROCESS_PORT = 8765
+CHATTERBOX_SOCKET_PATH = "/tmp/chatterbox.sock"
+# CombinedServer's max_inputs; each concurrent input needs at most one
+# connection to the subscript.
+COMBINED_MAX_INPUTS = 4
+CHATTERBOX_POOL_SIZE = COMBINED_MAX_INPUTS
 CHATTERBOX_SUBSCRIPT_REMOTE = "/chatterbox_subscript.py"
 CHATTERBOX_CRASH_TEXT = "RuntimeError: CUDA error: device-side assert triggered"
 CHATTERBOX_STARTUP_DL = 10 * MINUTES
+METRICS_RELAY_SECS = 60.0
+WARMUP_STEP_TIMEOUT_SECS = 600.0
+# Warmup runs behind real traffic once the frontends are up.
+WARMUP_PRIORITY = -5
+
+# Default warmup plan: text-length buckets (up to and past CHUNK_MAX_CHARS in
+# the subscript) and a second language for Chatterbox, short and long
+# prompts for Kiki. The first step of each service gates "partial"
+# readiness; the rest run in the background. Override with --warmup-plan.
+WARMUP_PLAN = {
+    "chatterbox": [
+        {"name": "short", "text": "Thanks for the follow!"},
+        {
+            "name": "medium",
+            "text": "Welcome in, everyone, grab a snack and get comfy, "
+            "we have a long one planned for tonight.",
+        },
+        {
+            "name": "long",
+            "text": "Thank you so much for the raid, that was an incredible "
+            "stream and I hope you all had as much fun as we did tonight. "
+            "Make sure to say hi in chat, check out the schedule for the "
+            "rest of the week, and remember to drink some water before "
+            "you settle in for the next game.",
+        },
+        {
+            "name": "chunked",
+            "text": "Okay chat, story time. " * 6
+            + "This one goes on for a while, so it gets split into "
+            "several chunks and stitched back together at the end, "
+            "which is exactly the path we want to have warmed up before "
+            "someone pastes a whole paragraph into a channel point redeem.",
+        },
+        {
+            "name": "short-ja",
+            "language_id": "ja",
+            "text": "フォローありがとうございます！",
+        },
+    ],
+    "kiki": [
+        {"name": "short", "prompt": "system: warmup"},
+        {
+            "name": "long",
+            "prompt": "system: warmup "
+            + "this is a longer chat message to warm up the prompt path. " * 8,
+        },
+    ],
+}
+
+AUDIO_CONTENT_TYPES = {
+    "wav": "audio/wav",
+    "opus": "audio/ogg",
+    "mp3": "audio/mpeg",
+    "pcm16": "audio/pcm",
+}
+# response_format -> (soundfile format, subtype); "pcm16" is passed through.
+_SOUNDFILE_FORMATS = {
+    "wav": ("WAV", "PCM_16"),
+    "opus": ("OGG", "OPUS"),
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+}
+_ACCEPT_FORMATS = {
+    "audio/wav": "wav",
+    "audio/wave": "wav",
+    "audio/x-wav": "wav",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/pcm": "pcm16",
+    "audio/l16": "pcm16",
+}
+
+# Framing on the subscript's socket; see _handle_connection there.
+_REQUEST_HEADER = struct.Struct(">I")
+_FRAME_HEADER = struct.Struct(">cI")
+FRAME_AUDIO = b"A"
+FRAME_END = b"E"
+FRAME_ERROR = b"X"
 
 RATING_MIN = -500.0
 RATING_MAX = 50.0
@@ -239,6 +347,77 @@ def upload_to_clone(local_path: str = "to_clone.wav"):
         batch.put_file(str(local), "/to_clone.wav")
     print(f"Uploaded {local_path} to chatterbox-models volume")
 
+    print("Regenerating voice conditionals...")
+    prepare_voice_conditionals.remote()
+    print("Voice conditionals ready")
+
+
+@app.local_entrypoint()
+def upload_voice(voice_id: str, local_path: str):
+    """Add a reference clip to the voice registry as ``voices/<voice_id>.wav``."""
+    import re
+
+    if not re.fullmatch(VOICE_ID_PATTERN, voice_id):
+        print(f"Error: voice id must be 1-64 letters, digits, '_' or '-': {voice_id!r}")
+        sys.exit(1)
+    local = Path(local_path)
+    if not local.exists():
+        print(f"Error: {local_path} not found")
+        sys.exit(1)
+
+    vol = modal.Volume.from_name("chatterbox-models", create_if_missing=True)
+    with vol.batch_upload(force=True) as batch:
+        batch.put_file(str(local), f"/voices/{voice_id}.wav")
+    print(f"Uploaded {local_path} as voice {voice_id!r}")
+
+    print("Preparing voice conditionals...")
+    prepare_voice_conditionals.remote(voice_id)
+    print("Voice conditionals ready")
+
+
+@app.function(
+    image=combined_image,
+    volumes={CHATTERBOX_MODEL_DIR: chatterbox_vol},
+    timeout=CHATTERBOX_STARTUP_DL,
+)
+def prepare_voice_conditionals(voice_id: str = ""):
+    """Serialize a voice's conditionals next to its clip on the volume."""
+    subprocess.run(
+        [
+            sys.executable,
+            "-u",
+            CHATTERBOX_SUBSCRIPT_REMOTE,
+            "--prepare-voice",
+            voice_id,
+        ],
+        stdin=subprocess.DEVNULL,
+        check=True,
+    )
+    chatterbox_vol.commit()
+
+
+@app.function(
+    image=combined_image,
+    volumes={CHATTERBOX_MODEL_DIR: chatterbox_vol},
+    timeout=30 * MINUTES,
+)
+def materialize_chatterbox_weights():
+    """Copy the Chatterbox checkpoint into ``weights/`` on the volume."""
+    subprocess.run(
+        [sys.executable, "-u", CHATTERBOX_SUBSCRIPT_REMOTE, "--materialize-weights"],
+        stdin=subprocess.DEVNULL,
+        check=True,
+    )
+    chatterbox_vol.commit()
+
+
+@app.local_entrypoint()
+def materialize_weights():
+    """Populate the volume's materialized weights; rerun after upgrading chatterbox."""
+    print("Materializing Chatterbox weights...")
+    materialize_chatterbox_weights.remote()
+    print("Chatterbox weights ready")
+
 
 @app.local_entrypoint()
 def upload_models():
@@ -264,18 +443,380 @@ def upload_models():
         )
 
 
+def _voice_clip_path(voice_id: str | None) -> str:
+    """The reference clip for ``voice_id``; the same rule as the subscript's."""
+    import re
+
+    if not voice_id:
+        return AUDIO_PROMPT_PATH
+    if not isinstance(voice_id, str) or not re.fullmatch(VOICE_ID_PATTERN, voice_id):
+        raise ChatterboxRequestError(f"invalid voice_id: {voice_id!r}", 400)
+    return os.path.join(CHATTERBOX_VOICES_DIR, f"{voice_id}.wav")
+
+
+def _tts_cache_key(
+    text: str,
+    language_id: str,
+    cfg_weight: float,
+    exaggeration: float,
+    voice_digest: str,
+    response_format: str,
+) -> str:
+    normalized = " ".join(text.split()).lower()
+    material = json.dumps(
+        [
+            TTS_CACHE_VERSION,
+            normalized,
+            language_id,
+            float(cfg_weight),
+            float(exaggeration),
+            voice_digest,
+            response_format,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class _AudioCache:
+    """Content-addressed audio cache with a memory and a disk tier.
+
+    The memory tier is an LRU bounded by total bytes. The disk tier lives on
+    the chatterbox volume as ``<dir>/<key[:2]>/<key>`` files; when it grows
+    past ``disk_bytes`` the least recently used files are deleted. Hits on
+    disk are promoted to memory and have their mtime bumped.
+    """
+
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int) -> None:
+        self._dir = directory
+        self._memory_bytes = memory_bytes
+        self._disk_bytes = disk_bytes
+        self._memory: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._memory_used = 0
+        self._disk: dict[str, tuple[int, float]] = {}
+        self._disk_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load_index(self) -> None:
+        """Index the disk tier; safe to run while the cache is in use.
+
+        Walking a full cache takes a while, so this runs in the background.
+        Until it finishes, older files on disk are misses; entries written
+        meanwhile are kept as they are.
+        """
+        os.makedirs(self._dir, exist_ok=True)
+        found: dict[str, tuple[int, float]] = {}
+        for root, _dirs, files in os.walk(self._dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue  # evicted since the listing
+                found[name] = (st.st_size, st.st_mtime)
+        with self._lock:
+            for name, (size, mtime) in found.items():
+                if name not in self._disk:
+                    self._disk[name] = (size, mtime)
+                    self._disk_used += size
+            entries, used = len(self._disk), self._disk_used
+        print(f"TTS cache: {entries} entries on disk ({used / 1e6:.1f} MB)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk),
+                "disk_mb": round(self._disk_used / 1e6, 1),
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, key[:2], key)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self._memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            on_disk = key in self._disk
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+        with self._lock:
+            if data is None:
+                if on_disk:
+                    size, _ = self._disk.pop(key, (0, 0.0))
+                    self._disk_used -= size
+                self.misses += 1
+                return None
+            self._disk[key] = (len(data), time.time())
+            self._remember(key, data)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._remember(key, data)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logging.exception("TTS cache write failed")
+            return
+        with self._lock:
+            size, _ = self._disk.get(key, (0, 0.0))
+            self._disk[key] = (len(data), time.time())
+            self._disk_used += len(data) - size
+            victims: list[str] = []
+            if self._disk_used > self._disk_bytes:
+                for victim, (vsize, _) in sorted(
+                    self._disk.items(), key=lambda item: item[1][1]
+                ):
+                    if self._disk_used <= self._disk_bytes:
+                        break
+                    if victim == key:
+                        continue
+                    victims.append(victim)
+                    self._disk_used -= vsize
+                for victim in victims:
+                    del self._disk[victim]
+        for victim in victims:
+            try:
+                os.remove(self._path(victim))
+            except OSError:
+                pass
+
+
+class ChatterboxBusyError(RuntimeError):
+    """The subscript's queue is full; ``retry_after`` is its drain estimate."""
+
+    def __init__(self, retry_after: float) -> None:
+        # ``args`` must be what __init__ takes so the error survives the
+        # pickling round trip back through Modal.
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"chatterbox busy, retry after {self.retry_after:.0f}s"
+
+
+class ChatterboxDeadlineError(RuntimeError):
+    """The request's deadline passed, or couldn't be met, before generation."""
+
+
+class ChatterboxRequestError(RuntimeError):
+    """The subscript rejected the request itself, e.g. an unknown voice."""
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message, status)
+        self.message = message
+        self.status = status
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def _raise_for_subscript(error: dict) -> NoReturn:
+    if error.get("status") == 503:
+        raise ChatterboxBusyError(float(error.get("retry_after", 1)))
+    if error.get("status") == 504:
+        raise ChatterboxDeadlineError(error.get("error"))
+    if error.get("status") in (400, 404):
+        raise ChatterboxRequestError(str(error.get("error")), error["status"])
+    raise RuntimeError(
+        f"chatterbox subscript returned {error.get('status')}: {error.get('error')}"
+    )
+
+
+def _encode_audio(pcm: bytes, response_format: str) -> bytes:
+    """Encode PCM16 from the subscript into ``response_format``."""
+    if response_format == "pcm16":
+        return pcm
+
+    import io
+
+    import numpy as np
+    import soundfile
+
+    sf_format, subtype = _SOUNDFILE_FORMATS[response_format]
+    buffer = io.BytesIO()
+    soundfile.write(
+        buffer,
+        np.frombuffer(pcm, dtype="<i2"),
+        SAMPLE_RATE,
+        format=sf_format,
+        subtype=subtype,
+    )
+    return buffer.getvalue()
+
+
+def _negotiate_audio_format(accept: str | None) -> str | None:
+    """Pick a ``response_format`` from an Accept header.
+
+    Media types are tried in descending q order; wildcards, a missing header
+    and headers naming no audio type at all (``application/json`` from a
+    generic client) fall back to WAV, or the first format not refused with
+    ``q=0``. Returns None when every type offered is an audio format we
+    can't produce, every entry has ``q=0``, or everything we can produce is
+    refused.
+    """
+    if not accept:
+        return "wav"
+    ranked: list[tuple[float, str]] = []
+    refused: set[str] = set()
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((q, media.lower()))
+        else:
+            refused.add(media.lower())
+    if not ranked:
+        return None  # every entry has q=0
+    if refused & {"*/*", "audio/*"}:
+        # Only formats named with a positive q are left.
+        allowed = []
+    else:
+        allowed = [
+            fmt
+            for fmt in dict.fromkeys(_ACCEPT_FORMATS.values())
+            if not any(_ACCEPT_FORMATS.get(media) == fmt for media in refused)
+        ]
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    for _, media in ranked:
+        if media in ("*/*", "audio/*"):
+            return allowed[0] if allowed else None
+        if media in _ACCEPT_FORMATS:
+            return _ACCEPT_FORMATS[media]
+    if ranked and all(media.startswith("audio/") for _, media in ranked):
+        return None
+    return allowed[0] if allowed else None
+
+
+def _parse_metrics(text: str) -> dict[str, float]:
+    """Flatten Prometheus text exposition into ``{series: value}``."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        samples[series] = float(value)
+    return samples
+
+
+def _summarize_metrics(samples: dict[str, float]) -> dict:
+    def _mean(name: str) -> float | None:
+        count = samples.get(f"{name}_count", 0.0)
+        if not count:
+            return None
+        return round(samples[f"{name}_sum"] / count, 3)
+
+    def _total(name: str) -> int:
+        return int(sum(v for k, v in samples.items() if k.partition("{")[0] == name))
+
+    prefix = 'chatterbox_requests_total{status="'
+    return {
+        "queue_depth": samples.get("chatterbox_queue_depth"),
+        "running": samples.get("chatterbox_running_jobs"),
+        "requests": {
+            k[len(prefix) : -2]: int(v)
+            for k, v in samples.items()
+            if k.startswith(prefix)
+        },
+        "errors": int(samples.get("chatterbox_generate_errors_total", 0)),
+        "cancelled": _total("chatterbox_cancelled_jobs_total"),
+        "deadline_dropped": _total("chatterbox_deadline_dropped_jobs_total"),
+        "length_guarded": _total("chatterbox_length_guard_total"),
+        "mean_request_secs": _mean("chatterbox_request_seconds"),
+        "mean_queue_wait_secs": _mean("chatterbox_queue_wait_seconds"),
+        "mean_synthesis_secs": _mean("chatterbox_synthesis_seconds"),
+        "mean_audio_secs": _mean("chatterbox_audio_seconds"),
+        "mean_rtf": _mean("chatterbox_real_time_factor"),
+    }
+
+
+def _server_timing(timings: dict[str, float]) -> str:
+    """Format ``{stage: seconds}`` as a ``Server-Timing`` header value."""
+    return ", ".join(f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items())
+
+
 class _ChatterboxSubprocess:
-    def __init__(self, port: int = CHATTERBOX_SUBPROCESS_PORT) -> None:
+    def __init__(
+        self,
+        port: int = CHATTERBOX_SUBPROCESS_PORT,
+        socket_path: str = CHATTERBOX_SOCKET_PATH,
+    ) -> None:
         self._port = port
         self._url = f"http://127.0.0.1:{port}"
+        self._socket_path = socket_path
+        # Idle generate connections, tagged with the subprocess generation
+        # they were opened against so a restart invalidates them.
+        self._idle: collections.deque[
+            tuple[int, asyncio.StreamReader, asyncio.StreamWriter]
+        ] = collections.deque()
+        self._generation = 0
+        # /health and /metrics go through one keep-alive session, bound to
+        # the event loop that called start(); _restart swaps it for a new one.
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._http: aiohttp.ClientSession | None = None
+        self._stats = {
+            "http_opened": 0,
+            "http_reused": 0,
+            "socket_opened": 0,
+            "socket_reused": 0,
+        }
         self._lock = threading.Lock()
         self._ready = threading.Event()
         self._proc: subprocess.Popen | None = None
         self._stderr_thread: threading.Thread | None = None
 
-    def start(self) -> None:
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._http = self._new_http_session()
+        self._spawn()
+        await self._wait_ready()
+
+    def _spawn(self) -> None:
         self._proc = subprocess.Popen(
-            [sys.executable, "-u", CHATTERBOX_SUBSCRIPT_REMOTE, "--port", str(self._port)],
+            [
+                sys.executable,
+                "-u",
+                CHATTERBOX_SUBSCRIPT_REMOTE,
+                "--port",
+                str(self._port),
+                "--socket",
+                self._socket_path,
+            ],
             stdin=subprocess.DEVNULL,
             stderr=subprocess.PIPE,
             text=True,
@@ -288,19 +829,45 @@ class _ChatterboxSubprocess:
             daemon=True,
         )
         self._stderr_thread.start()
-        self._wait_ready()
 
-    def _wait_ready(self) -> None:
+    def _new_http_session(self) -> aiohttp.ClientSession:
+        async def _opened(session, ctx, params) -> None:
+            self._stats["http_opened"] += 1
+
+        async def _reused(session, ctx, params) -> None:
+            self._stats["http_reused"] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(_opened)
+        trace.on_connection_reuseconn.append(_reused)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CHATTERBOX_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(total=30),
+            trace_configs=[trace],
+        )
+
+    async def _wait_ready(self) -> None:
+        assert self._http is not None
         deadline = time.time() + CHATTERBOX_STARTUP_DL
         while time.time() < deadline:
             try:
-                urllib.request.urlopen(f"{self._url}/health", timeout=5)
+                async with self._http.get(
+                    f"{self._url}/health", timeout=aiohttp.ClientTimeout(total=5)
+                ) as resp:
+                    resp.raise_for_status()
                 self._ready.set()
                 return
             except Exception:
-                time.sleep(2)
+                await asyncio.sleep(2)
         raise RuntimeError("chatterbox subscript failed to start within timeout")
 
+    async def _reconnect(self) -> None:
+        """Replace the HTTP session and wait for the new subprocess."""
+        if self._http is not None:
+            await self._http.close()
+        self._http = self._new_http_session()
+        await self._wait_ready()
+
     def _watch_stderr(self, proc: subprocess.Popen) -> None:
         assert proc.stderr is not None
         for line in proc.stderr:
@@ -317,6 +884,7 @@ class _ChatterboxSubprocess:
     def _restart(self) -> None:
         with self._lock:
             self._ready.clear()
+            self._generation += 1
             if self._proc is not None and self._proc.poll() is None:
                 self._proc.terminate()
                 try:
@@ -324,27 +892,74 @@ class _ChatterboxSubprocess:
                 except subprocess.TimeoutExpired:
                     self._proc.kill()
                     self._proc.wait()
-            self._proc = subprocess.Popen(
-                [
-                    sys.executable,
-                    "-u",
-                    CHATTERBOX_SUBSCRIPT_REMOTE,
-                    "--port",
-                    str(self._port),
-                ],
-                stdin=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-            )
-            assert self._proc.stderr is not None
-            self._stderr_thread = threading.Thread(
-                target=self._watch_stderr,
-                args=(self._proc,),
-                daemon=True,
-            )
-            self._stderr_thread.start()
-            self._wait_ready()
+            self._spawn()
+            # Runs on the stderr watcher thread; the session lives on the
+            # event loop.
+            assert self._loop is not None
+            asyncio.run_coroutine_threadsafe(self._reconnect(), self._loop).result()
+
+    async def _acquire(
+        self,
+    ) -> tuple[int, asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            conn = self._idle.pop()
+            if conn[0] == self._generation and not conn[2].is_closing():
+                self._stats["socket_reused"] += 1
+                return conn
+            conn[2].close()
+        reader, writer = await asyncio.open_unix_connection(self._socket_path)
+        self._stats["socket_opened"] += 1
+        return self._generation, reader, writer
+
+    def _release(
+        self, conn: tuple[int, asyncio.StreamReader, asyncio.StreamWriter]
+    ) -> None:
+        if conn[0] == self._generation and len(self._idle) < CHATTERBOX_POOL_SIZE:
+            self._idle.append(conn)
+        else:
+            conn[2].close()
+
+    async def _frames(
+        self, params: dict, trailer: dict | None = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Send one generate request and yield its PCM16 audio frames.
+
+        The connection goes back to the pool only once the reply has been
+        read to its end; otherwise it is closed, which the subscript takes
+        as a cancellation. ``trailer``, if given, is updated with the end
+        frame's JSON.
+        """
+        if not self._ready.is_set():
+            raise RuntimeError("chatterbox subscript not ready")
+        conn = await self._acquire()
+        _, reader, writer = conn
+        complete = False
+        try:
+            payload = json.dumps(params).encode()
+            writer.write(_REQUEST_HEADER.pack(len(payload)) + payload)
+            await writer.drain()
+            while True:
+                kind, length = _FRAME_HEADER.unpack(
+                    await reader.readexactly(_FRAME_HEADER.size)
+                )
+                body = await reader.readexactly(length)
+                if kind == FRAME_AUDIO:
+                    yield body
+                elif kind == FRAME_END:
+                    complete = True
+                    if trailer is not None:
+                        trailer.update(json.loads(body))
+                    return
+                elif kind == FRAME_ERROR:
+                    complete = True
+                    _raise_for_subscript(json.loads(body))
+                else:
+                    raise RuntimeError(f"unknown frame type from subscript: {kind!r}")
+        finally:
+            if complete:
+                self._release(conn)
+            else:
+                writer.close()
 
     async def request(
         self,
@@ -352,31 +967,87 @@ class _ChatterboxSubprocess:
         language_id: str = "en",
         cfg_weight: float = 0.5,
         exaggeration: float = 0.5,
-    ) -> bytes:
-        if not self._ready.is_set():
-            raise RuntimeError("chatterbox subscript not ready")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self._url}/generate",
-                json={
-                    "text": text,
-                    "language_id": language_id,
-                    "cfg_weight": cfg_weight,
-                    "exaggeration": exaggeration,
-                },
-            ) as resp:
-                if resp.status != 200:
-                    body = await resp.text()
-                    raise RuntimeError(
-                        f"chatterbox subscript returned {resp.status}: {body}"
-                    )
-                return await resp.read()
-
-    def stop(self) -> None:
+        voice_id: str | None = None,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> tuple[bytes, dict[str, float]]:
+        """Synthesize ``text``; returns mono PCM16 at ``SAMPLE_RATE``.
+
+        ``deadline`` is a unix timestamp after which the subscript drops the
+        request instead of generating it. Also returns seconds per stage: the
+        subscript's ``queue``, ``inference`` and ``postprocess``, its own
+        overhead as ``subscript``, and the rest of the round trip as
+        ``socket``.
+        """
+        started = time.monotonic()
+        params = {
+            "text": text,
+            "language_id": language_id,
+            "cfg_weight": cfg_weight,
+            "exaggeration": exaggeration,
+            "voice_id": voice_id,
+            "priority": priority,
+            "deadline": deadline,
+        }
+        trailer: dict = {}
+        async with aclosing(self._frames(params, trailer)) as frames:
+            pcm = b"".join([frame async for frame in frames])
+        timings = trailer.get("timings", {})
+        total = timings.pop("total", 0.0)
+        timings["subscript"] = total - sum(timings.values())
+        timings["socket"] = time.monotonic() - started - total
+        return pcm, timings
+
+    async def queue_status(self) -> dict:
+        assert self._http is not None
+        async with self._http.get(f"{self._url}/health") as resp:
+            resp.raise_for_status()
+            return await resp.json()
+
+    async def scrape_metrics(self) -> dict[str, float]:
+        assert self._http is not None
+        async with self._http.get(f"{self._url}/metrics") as resp:
+            resp.raise_for_status()
+            return _parse_metrics(await resp.text())
+
+    def connection_stats(self) -> dict[str, int]:
+        """Connections opened vs. reused, for the HTTP session and socket pool."""
+        return dict(self._stats)
+
+    async def request_stream(
+        self,
+        text: str,
+        language_id: str = "en",
+        cfg_weight: float = 0.5,
+        exaggeration: float = 0.5,
+        voice_id: str | None = None,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield one PCM16 chunk per synthesized segment as it becomes ready."""
+        params = {
+            "text": text,
+            "language_id": language_id,
+            "cfg_weight": cfg_weight,
+            "exaggeration": exaggeration,
+            "voice_id": voice_id,
+            "priority": priority,
+            "deadline": deadline,
+            "stream": True,
+        }
+        async with aclosing(self._frames(params)) as frames:
+            async for frame in frames:
+                yield frame
+
+    async def stop(self) -> None:
+        if self._http is not None:
+            await self._http.close()
+        while self._idle:
+            self._idle.pop()[2].close()
         if self._proc is not None and self._proc.poll() is None:
             self._proc.terminate()
             try:
-                self._proc.wait(timeout=10)
+                await asyncio.to_thread(self._proc.wait, timeout=10)
             except subprocess.TimeoutExpired:
                 self._proc.kill()
                 self._proc.wait()
@@ -390,12 +1061,12 @@ class _ChatterboxSubprocess:
     volumes={KIKI_MODEL_DIR: kiki_vol, CHATTERBOX_MODEL_DIR: chatterbox_vol},
     max_containers=1,
 )
-@modal.concurrent(max_inputs=4)
+@modal.concurrent(max_inputs=COMBINED_MAX_INPUTS)
 class CombinedServer:
     @modal.enter()
-    def load(self):
-        self._start_ollama()
-        self._load_chatterbox()
+    async def load(self):
+        await asyncio.to_thread(self._start_ollama)
+        await self._load_chatterbox()
 
     def _start_ollama(self):
         env = os.environ.copy()
@@ -442,9 +1113,57 @@ class CombinedServer:
                 time.sleep(2)
         raise RuntimeError("Ollama server failed to start within timeout")
 
-    def _load_chatterbox(self):
+    async def _load_chatterbox(self):
+        self._voice_digests: dict[str, tuple[tuple[int, int], str]] = {}
+        self._tts_cache = _AudioCache(
+            TTS_CACHE_DIR, TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES
+        )
+        self._tts_cache_index = asyncio.create_task(
+            asyncio.to_thread(self._tts_cache.load_index)
+        )
+        self._volume_reloaded = time.monotonic()
+        self._volume_lock = asyncio.Lock()
+        self._streams: dict[str, asyncio.Task] = {}
         self._chatterbox = _ChatterboxSubprocess()
-        self._chatterbox.start()
+        await self._chatterbox.start()
+
+    async def _reload_volume(self, voice_id: str | None) -> None:
+        """Pick up clips and conditionals other containers committed.
+
+        A running container only sees the uploaders' commits after a reload,
+        and the subscript rebuilds a voice once its files change on disk.
+        Requests trigger it, at most every VOLUME_RELOAD_SECS, or every
+        VOLUME_MISS_RELOAD_SECS while the requested clip is missing.
+        """
+        interval = VOLUME_RELOAD_SECS
+        if not os.path.exists(_voice_clip_path(voice_id)):
+            interval = VOLUME_MISS_RELOAD_SECS
+        if time.monotonic() - self._volume_reloaded < interval:
+            return
+        async with self._volume_lock:
+            if time.monotonic() - self._volume_reloaded < interval:
+                return
+            self._volume_reloaded = time.monotonic()
+            try:
+                await chatterbox_vol.reload.aio()
+            except Exception as e:
+                # e.g. files held open by an in-flight request; next time.
+                logging.warning("Chatterbox volume reload failed: %s", e)
+
+    def _voice_digest(self, voice_id: str | None) -> str:
+        path = _voice_clip_path(voice_id)
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        cached = self._voice_digests.get(path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self._voice_digests[path] = (stat_key, digest)
+        return digest
 
     @modal.method()
     async def chat(self, content: str, timeout: float | None = None) -> dict:
@@ -503,29 +1222,288 @@ class CombinedServer:
         language_id: str = "en",
         cfg_weight: float = 0.5,
         exaggeration: float = 0.5,
-    ) -> bytes:
-        if not os.path.exists(AUDIO_PROMPT_PATH):
+        voice_id: str | None = None,
+        response_format: str = "wav",
+        use_cache: bool = True,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> dict:
+        """Synthesize ``text``.
+
+        Returns ``{"audio", "content_type", "cache_hit", "timings"}``, the
+        last being seconds spent per stage in this container.
+        """
+        await self._reload_volume(voice_id)
+        if not voice_id and not os.path.exists(AUDIO_PROMPT_PATH):
             raise FileNotFoundError(
                 f"Audio prompt not found at {AUDIO_PROMPT_PATH}. "
                 "Run `modal run chatterbox_runner.py::upload_to_clone` first."
             )
-        return await self._chatterbox.request(
+        content_type = AUDIO_CONTENT_TYPES[response_format]
+
+        started = time.monotonic()
+        timings: dict[str, float] = {}
+        key = None
+        if use_cache:
+            try:
+                voice_digest = await asyncio.to_thread(self._voice_digest, voice_id)
+            except FileNotFoundError:
+                voice_digest = None
+            if voice_digest is not None:
+                key = _tts_cache_key(
+                    text,
+                    language_id,
+                    cfg_weight,
+                    exaggeration,
+                    voice_digest,
+                    response_format,
+                )
+                audio = await asyncio.to_thread(self._tts_cache.get, key)
+                if audio is not None:
+                    print(f"TTS cache hit: {key[:12]} ({len(audio)} bytes)")
+                    timings["cache"] = time.monotonic() - started
+                    return {
+                        "audio": audio,
+                        "content_type": content_type,
+                        "cache_hit": True,
+                        "timings": timings,
+                    }
+        timings["cache"] = time.monotonic() - started
+
+        pcm, subscript_timings = await self._chatterbox.request(
             text=text,
             language_id=language_id,
             cfg_weight=cfg_weight,
             exaggeration=exaggeration,
+            voice_id=voice_id,
+            priority=priority,
+            deadline=deadline,
         )
+        timings.update(subscript_timings)
+        started = time.monotonic()
+        audio = await asyncio.to_thread(_encode_audio, pcm, response_format)
+        timings["encode"] = time.monotonic() - started
+        if key is not None:
+            started = time.monotonic()
+            await asyncio.to_thread(self._tts_cache.put, key, audio)
+            timings["cache"] += time.monotonic() - started
+        return {
+            "audio": audio,
+            "content_type": content_type,
+            "cache_hit": False,
+            "timings": timings,
+        }
+
+    @modal.method()
+    async def queue_status(self) -> dict:
+        """Subscript queue depth, capacity and drain estimate."""
+        return await self._chatterbox.queue_status()
+
+    @modal.method()
+    async def metrics(self) -> dict:
+        """Summary of the subscript's /metrics, connection reuse, TTS cache."""
+        summary = _summarize_metrics(await self._chatterbox.scrape_metrics())
+        summary["connections"] = self._chatterbox.connection_stats()
+        summary["tts_cache"] = self._tts_cache.stats()
+        return summary
+
+    @modal.method()
+    async def generate_stream(
+        self,
+        text: str,
+        language_id: str = "en",
+        cfg_weight: float = 0.5,
+        exaggeration: float = 0.5,
+        voice_id: str | None = None,
+        request_id: str | None = None,
+        priority: int = 0,
+        deadline: float | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream PCM16 segments; ``request_id`` lets ``cancel_stream`` stop it."""
+        await self._reload_volume(voice_id)
+        if not voice_id and not os.path.exists(AUDIO_PROMPT_PATH):
+            raise FileNotFoundError(
+                f"Audio prompt not found at {AUDIO_PROMPT_PATH}. "
+                "Run `modal run chatterbox_runner.py::upload_to_clone` first."
+            )
+        task = asyncio.current_task()
+        if request_id and task is not None:
+            self._streams[request_id] = task
+        try:
+            async for chunk in self._chatterbox.request_stream(
+                text=text,
+                language_id=language_id,
+                cfg_weight=cfg_weight,
+                exaggeration=exaggeration,
+                voice_id=voice_id,
+                priority=priority,
+                deadline=deadline,
+            ):
+                yield chunk
+        finally:
+            if request_id:
+                self._streams.pop(request_id, None)
+
+    @modal.method()
+    async def cancel_stream(self, request_id: str) -> bool:
+        """Cancel a running ``generate_stream``.
+
+        Generator calls can't be cancelled through ``FunctionCall``, so the
+        frontend calls this when its client goes away. Cancelling the input's
+        task closes the connection to the subscript, which drops the
+        remaining segments.
+        """
+        task = self._streams.pop(request_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
 
     @modal.exit()
-    def cleanup(self):
+    async def cleanup(self):
         print("Combined server shutting down")
-        self._chatterbox.stop()
+        await self._chatterbox.stop()
         if hasattr(self, "_ollama_process"):
             self._ollama_process.terminate()
             self._ollama_process.wait()
 
 
-_warmed_up = asyncio.Event()
+def _normalize_message(message: str) -> str:
+    """Cache key for a Kiki message: NFKC, case-folded, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", message).casefold().split())
+
+
+class _ReactionCache:
+    """Bounded TTL cache of Kiki reactions with single-flight lookups.
+
+    Concurrent lookups of the same key share one in-flight ``fetch``.
+    Successful results are kept for ``ttl`` seconds, at most ``size`` of
+    them, least recently used evicted first; failures are not cached.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self._size = size
+        self._ttl = ttl
+        self._entries: collections.OrderedDict[str, tuple[float, dict]] = (
+            collections.OrderedDict()
+        )
+        self._inflight: dict[str, asyncio.Future[dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(
+        self, key: str, fetch: Callable[[], Awaitable[dict]]
+    ) -> tuple[dict, bool]:
+        """Return ``(reaction, shared)``; ``shared`` is false only for the
+        lookup that made the call."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], True
+            del self._entries[key]
+        call = self._inflight.get(key)
+        shared = call is not None
+        if call is None:
+            self.misses += 1
+            call = asyncio.ensure_future(fetch())
+            self._inflight[key] = call
+            call.add_done_callback(lambda done: self._settle(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so one client going away doesn't cancel the call the
+        # others are waiting on.
+        return await asyncio.shield(call), shared
+
+    def _settle(self, key: str, call: asyncio.Future[dict]) -> None:
+        self._inflight.pop(key, None)
+        if call.cancelled() or call.exception() is not None:
+            return
+        self._entries[key] = (time.monotonic() + self._ttl, call.result())
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
+
+
+class _CaptureLog:
+    """Append-only JSONL record of frontend requests, for tts_replay.py.
+
+    One line per request: arrival time (unix seconds), which frontend it
+    hit, the query and JSON body it carried, the response status and the
+    latency until the response (or the last streamed chunk) was written.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def middleware(self, endpoint: str):
+        import aiohttp.web
+
+        @aiohttp.web.middleware
+        async def _capture(request: aiohttp.web.Request, handler):
+            arrived = time.time()
+            started = time.monotonic()
+            body = None
+            if request.can_read_body:
+                # read() caches the payload, so the handler can still read it.
+                try:
+                    body = json.loads(await request.read())
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    body = None
+            status = 0
+            try:
+                resp = await handler(request)
+                status = resp.status
+                return resp
+            finally:
+                self._write(
+                    {
+                        "ts": arrived,
+                        "endpoint": endpoint,
+                        "method": request.method,
+                        "path": request.path,
+                        "query": dict(request.query),
+                        "accept": request.headers.get("Accept"),
+                        "body": body,
+                        "status": status,
+                        "latency": round(time.monotonic() - started, 4),
+                    }
+                )
+
+        return _capture
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _load_warmup_plan(path: str) -> dict[str, list[dict]]:
+    if not path:
+        return WARMUP_PLAN
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    for service in ("chatterbox", "kiki"):
+        if not plan.get(service):
+            raise ValueError(f"warmup plan {path} has no {service} steps")
+    return plan
+
+
+# "cold" until the first warmup step of each service is done, then
+# "partial" (serving) until the whole plan has run, then "warm".
+_READINESS = "cold"
+_WARMUP_TIMINGS: list[dict] = []
 _IMPORTANT_ACTIVE = False
 
 
@@ -534,7 +1512,17 @@ async def main(
     host: str = "localhost",
     audio_port: int = AUDIO_PORT,
     kiki_port: int = KIKI_WEB_PORT,
+    capture_log: str = "",
+    warmup_plan: str = "",
 ):
+    """Serve the TTS and Kiki frontends.
+
+    ``--capture-log PATH`` appends every request to PATH as JSONL, for
+    replaying with tts_replay.py. ``--warmup-plan PATH`` replaces
+    ``WARMUP_PLAN`` with a JSON file of the same shape.
+    """
+    global _READINESS
+
     from shared.bus_receiver import run_receiver
 
     install_bus_logging("[Heavy]")
@@ -557,36 +1545,229 @@ async def main(
 
     server = CombinedServer()
 
-    async def _warmup_audio():
-        logging.info("Warming up Chatterbox TTS...")
-        try:
-            await asyncio.wait_for(
-                server.generate.remote.aio("warmup"),
-                timeout=600,
-            )
-        except Exception:
-            logging.exception("Chatterbox warmup failed")
+    plan = _load_warmup_plan(warmup_plan)
+    warmup_total = sum(len(steps) for steps in plan.values())
 
-    async def _warmup_kiki():
-        logging.info("Warming up Kiki...")
+    async def _warm(service: str, step: dict) -> None:
+        started = time.monotonic()
+        ok = True
         try:
-            await asyncio.wait_for(
-                server.chat.remote.aio("system: warmup", 300),
-                timeout=600,
-            )
+            if service == "chatterbox":
+                await asyncio.wait_for(
+                    server.generate.remote.aio(
+                        step["text"],
+                        language_id=step.get("language_id", "en"),
+                        use_cache=False,
+                        priority=WARMUP_PRIORITY,
+                    ),
+                    timeout=WARMUP_STEP_TIMEOUT_SECS,
+                )
+            else:
+                await asyncio.wait_for(
+                    server.chat.remote.aio(step["prompt"], 300),
+                    timeout=WARMUP_STEP_TIMEOUT_SECS,
+                )
         except Exception:
-            logging.exception("Kiki warmup failed")
+            ok = False
+            logging.exception("Warmup %s/%s failed", service, step["name"])
+        secs = time.monotonic() - started
+        _WARMUP_TIMINGS.append(
+            {"service": service, "name": step["name"], "secs": round(secs, 3), "ok": ok}
+        )
+        logging.info(
+            "Warmup %d/%d: %s/%s %.2fs%s",
+            len(_WARMUP_TIMINGS),
+            warmup_total,
+            service,
+            step["name"],
+            secs,
+            "" if ok else " (failed)",
+        )
+
+    async def _finish_warmup() -> None:
+        global _READINESS
+
+        async def _rest(service: str) -> None:
+            for step in plan[service][1:]:
+                await _warm(service, step)
+
+        await asyncio.gather(_rest("chatterbox"), _rest("kiki"))
+        _READINESS = "warm"
+        logging.info(
+            "Warmup complete: %s",
+            ", ".join(
+                f"{t['service']}/{t['name']} {t['secs']:.1f}s" for t in _WARMUP_TIMINGS
+            ),
+        )
 
-    await asyncio.gather(_warmup_audio(), _warmup_kiki())
-    _warmed_up.set()
-    logging.info("Warmup complete, server ready")
+    logging.info("Warming up Chatterbox TTS and Kiki (%d steps)...", warmup_total)
+    await asyncio.gather(
+        _warm("chatterbox", plan["chatterbox"][0]), _warm("kiki", plan["kiki"][0])
+    )
+    _READINESS = "partial"
+    logging.info("Server ready (partially warm), finishing warmup in background")
 
     import aiohttp.web
 
-    async def handle_generate(request: aiohttp.web.Request) -> aiohttp.web.Response:
+    tts_requests = 0
+
+    async def _relay_metrics() -> None:
+        # Only scrape after TTS traffic, so an idle frontend doesn't keep the
+        # container from scaling down.
+        relayed = tts_requests
+        while True:
+            await asyncio.sleep(METRICS_RELAY_SECS)
+            if tts_requests == relayed:
+                continue
+            relayed = tts_requests
+            try:
+                summary = await server.metrics.remote.aio()
+            except Exception:
+                logging.exception("Chatterbox metrics scrape failed")
+                continue
+            logging.info("Chatterbox metrics: %s", json.dumps(summary))
+
+    async def _cancel_remote(cancel) -> None:
+        # Shielded by callers: the handler may itself be mid-cancellation.
+        try:
+            await cancel
+        except Exception:
+            logging.exception("Cancelling remote generate failed")
+
+    def _busy_response(e: ChatterboxBusyError) -> aiohttp.web.Response:
+        return aiohttp.web.Response(
+            text="chatterbox busy",
+            status=503,
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Retry-After": str(max(1, math.ceil(e.retry_after))),
+            },
+        )
+
+    def _log_timing(timings: dict[str, float], **fields) -> None:
+        # One line per request, for the overlay to chart.
+        logging.info(
+            "TTS timing: %s",
+            json.dumps(
+                {**fields, "timings": {k: round(v, 4) for k, v in timings.items()}}
+            ),
+        )
+
+    async def handle_generate_stream(
+        request: aiohttp.web.Request,
+        prompt: str,
+        language_id: str,
+        cfg_weight: float,
+        exaggeration: float,
+        voice_id: str | None,
+        priority: int,
+        deadline: float,
+        started: float,
+        timings: dict[str, float],
+    ) -> aiohttp.web.StreamResponse:
+        """Relay ``generate_stream`` as chunked PCM.
+
+        Headers go out with the first segment, so their ``Server-Timing``
+        covers only parsing and time to first audio (``first_audio``);
+        the bus log line adds ``total``.
+        """
+        status = 500
+        segments = 0
+        stream_resp = aiohttp.web.StreamResponse(
+            status=200,
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Cache-Control": "no-cache",
+                "X-Sample-Rate": str(SAMPLE_RATE),
+            },
+        )
+        stream_resp.content_type = "audio/pcm"
+        stream_resp.enable_chunked_encoding()
+        request_id = uuid.uuid4().hex
+        try:
+            async with asyncio.timeout(max(0.0, deadline - time.time())):
+                async for chunk in server.generate_stream.remote_gen.aio(
+                    prompt,
+                    language_id=language_id,
+                    cfg_weight=cfg_weight,
+                    exaggeration=exaggeration,
+                    voice_id=voice_id,
+                    request_id=request_id,
+                    priority=priority,
+                    deadline=deadline,
+                ):
+                    if not stream_resp.prepared:
+                        timings["first_audio"] = time.monotonic() - started
+                        stream_resp.headers["Server-Timing"] = _server_timing(timings)
+                        await stream_resp.prepare(request)
+                    await stream_resp.write(chunk)
+                    segments += 1
+            if not stream_resp.prepared:
+                await stream_resp.prepare(request)
+            await stream_resp.write_eof()
+            status = 200
+        except ChatterboxBusyError as e:
+            logging.warning("Generate stream rejected: %s", e)
+            status = 503
+            if not stream_resp.prepared:
+                return _busy_response(e)
+            raise
+        except ChatterboxDeadlineError as e:
+            logging.warning("Generate stream dropped: %s", e)
+            status = 504
+            if not stream_resp.prepared:
+                return aiohttp.web.Response(text="deadline exceeded", status=504)
+            raise
+        except ChatterboxRequestError as e:
+            logging.warning("Generate stream refused: %s", e)
+            status = e.status
+            if not stream_resp.prepared:
+                return aiohttp.web.Response(text=str(e), status=e.status)
+            raise
+        except asyncio.TimeoutError:
+            logging.error("Generate stream missed its deadline")
+            status = 504
+            await asyncio.shield(
+                _cancel_remote(server.cancel_stream.remote.aio(request_id))
+            )
+            if not stream_resp.prepared:
+                return aiohttp.web.Response(text="generate timeout", status=504)
+            # Headers are out; dropping the connection is the only way left
+            # to tell the client the body is incomplete.
+            raise
+        except (asyncio.CancelledError, ConnectionResetError):
+            logging.info("Generate stream client went away, cancelling")
+            status = 499  # client closed request
+            await asyncio.shield(
+                _cancel_remote(server.cancel_stream.remote.aio(request_id))
+            )
+            raise
+        except Exception as e:
+            logging.exception("Generate stream failed")
+            if not stream_resp.prepared:
+                return aiohttp.web.Response(text=str(e), status=500)
+            raise
+        finally:
+            timings["total"] = time.monotonic() - started
+            _log_timing(
+                timings,
+                stream=True,
+                status=status,
+                chars=len(prompt),
+                language_id=language_id,
+                segments=segments,
+            )
+        return stream_resp
+
+    async def handle_generate(
+        request: aiohttp.web.Request,
+    ) -> aiohttp.web.StreamResponse:
+        nonlocal tts_requests
+        tts_requests += 1
+        started = time.monotonic()
         if _IMPORTANT_ACTIVE:
             return aiohttp.web.Response(status=503, text="important mode")
-        if not _warmed_up.is_set():
+        if _READINESS == "cold":
             return aiohttp.web.Response(
                 text="Server warming up",
                 status=500,
@@ -604,38 +1785,153 @@ async def main(
         language_id = body.get("language_id", "en")
         cfg_weight = body.get("cfg_weight", 0.5)
         exaggeration = body.get("exaggeration", 0.5)
+        voice_id = body.get("voice_id") or None
+        priority = body.get("priority", 0)
+        if not isinstance(priority, int):
+            return aiohttp.web.Response(text="priority must be an integer", status=400)
+        # Absolute (unix time) deadline, carried to the subscript so work the
+        # client has given up on is dropped rather than generated.
+        deadline = time.time() + TIMEOUT_SECS
+        client_deadline = body.get("deadline", request.headers.get("X-Deadline"))
+        if client_deadline is not None:
+            try:
+                deadline = min(deadline, float(client_deadline))
+            except (TypeError, ValueError):
+                return aiohttp.web.Response(
+                    text="deadline must be a unix timestamp", status=400
+                )
+        response_format = body.get("response_format") or _negotiate_audio_format(
+            request.headers.get("Accept")
+        )
+        if response_format is None:
+            return aiohttp.web.Response(text="no acceptable audio format", status=406)
+        if (
+            not isinstance(response_format, str)
+            or response_format not in AUDIO_CONTENT_TYPES
+        ):
+            return aiohttp.web.Response(
+                text=f"unsupported response_format: {response_format}", status=400
+            )
 
-        logging.info("Generate: text='%s...' lang=%s", prompt[:40], language_id)
+        logging.info(
+            "Generate: text='%s...' lang=%s voice=%s",
+            prompt[:40],
+            language_id,
+            voice_id or "default",
+        )
+
+        timings = {"parse": time.monotonic() - started}
+        if body.get("stream"):
+            return await handle_generate_stream(
+                request,
+                prompt,
+                language_id,
+                cfg_weight,
+                exaggeration,
+                voice_id,
+                priority,
+                deadline,
+                started,
+                timings,
+            )
 
+        # Spawned rather than awaited with .remote so that a timeout or a
+        # disconnected client can cancel the call; the cancellation reaches
+        # the subscript, which stops decoding at the next step.
+        call = None
+        status = 500
+        cache_hit = False
         try:
-            wav_bytes = await asyncio.wait_for(
-                server.generate.remote.aio(
-                    prompt,
-                    language_id=language_id,
-                    cfg_weight=cfg_weight,
-                    exaggeration=exaggeration,
-                ),
-                timeout=TIMEOUT_SECS,
+            stage_started = time.monotonic()
+            call = await server.generate.spawn.aio(
+                prompt,
+                language_id=language_id,
+                cfg_weight=cfg_weight,
+                exaggeration=exaggeration,
+                voice_id=voice_id,
+                response_format=response_format,
+                priority=priority,
+                deadline=deadline,
             )
+            timings["spawn"] = time.monotonic() - stage_started
+            stage_started = time.monotonic()
+            result = await asyncio.wait_for(
+                call.get.aio(), timeout=max(0.0, deadline - time.time())
+            )
+            # Whatever the container didn't account for went to the Modal
+            # round trip: RPC, input queueing and (de)serialization.
+            timings["modal"] = (
+                time.monotonic() - stage_started - sum(result["timings"].values())
+            )
+            timings.update(result["timings"])
+            timings["total"] = time.monotonic() - started
+            cache_hit = result["cache_hit"]
+            headers_out = {
+                "Access-Control-Allow-Origin": "*",
+                "Cache-Control": "no-cache",
+                "Vary": "Accept",
+                "Server-Timing": _server_timing(timings),
+            }
+            if result["cache_hit"]:
+                headers_out["X-Cache-Hit"] = "true"
+            status = 200
             return aiohttp.web.Response(
-                body=wav_bytes,
-                content_type="audio/wav",
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Cache-Control": "no-cache",
-                },
+                body=result["audio"],
+                content_type=result["content_type"],
+                headers=headers_out,
             )
+        except ChatterboxBusyError as e:
+            logging.warning("Generate rejected: %s", e)
+            status = 503
+            return _busy_response(e)
+        except ChatterboxDeadlineError as e:
+            logging.warning("Generate dropped: %s", e)
+            status = 504
+            return aiohttp.web.Response(text="deadline exceeded", status=504)
+        except ChatterboxRequestError as e:
+            logging.warning("Generate refused: %s", e)
+            status = e.status
+            return aiohttp.web.Response(text=str(e), status=e.status)
         except asyncio.TimeoutError:
-            logging.error("Generate timed out after %ss", TIMEOUT_SECS)
+            logging.error("Generate missed its deadline")
+            status = 504
+            if call is not None:
+                await asyncio.shield(_cancel_remote(call.cancel.aio()))
             return aiohttp.web.Response(text="generate timeout", status=504)
+        except asyncio.CancelledError:
+            logging.info("Generate client went away, cancelling")
+            status = 499  # client closed request
+            if call is not None:
+                await asyncio.shield(_cancel_remote(call.cancel.aio()))
+            raise
         except Exception as e:
             logging.exception("Generate failed")
             return aiohttp.web.Response(text=str(e), status=500)
+        finally:
+            timings.setdefault("total", time.monotonic() - started)
+            _log_timing(
+                timings,
+                stream=False,
+                status=status,
+                chars=len(prompt),
+                language_id=language_id,
+                format=response_format,
+                cache_hit=cache_hit,
+            )
+
+    async def handle_ready(request: aiohttp.web.Request) -> aiohttp.web.Response:
+        return aiohttp.web.json_response(
+            {"level": _READINESS, "warmup": _WARMUP_TIMINGS},
+            status=503 if _READINESS == "cold" else 200,
+            headers={"Access-Control-Allow-Origin": "*"},
+        )
+
+    kiki_cache = _ReactionCache(KIKI_CACHE_SIZE, KIKI_CACHE_TTL_SECS)
 
     async def handle_kiki(request: aiohttp.web.Request) -> aiohttp.web.Response:
         if _IMPORTANT_ACTIVE:
             return aiohttp.web.Response(status=503, text="important mode")
-        if not _warmed_up.is_set():
+        if _READINESS == "cold":
             return aiohttp.web.Response(
                 text='{"error": "Server warming up"}',
                 status=500,
@@ -653,7 +1949,9 @@ async def main(
                 status=400,
             )
         try:
-            obj = await server.chat.remote.aio(message)
+            obj, cache_hit = await kiki_cache.get(
+                _normalize_message(message), lambda: server.chat.remote.aio(message)
+            )
 
             body = json.dumps(
                 {
@@ -663,14 +1961,13 @@ async def main(
                     "pin_worthy": obj.get("pin_worthy", False),
                 }
             )
-            return aiohttp.web.Response(
-                text=body,
-                status=200,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Cache-Control": "no-cache, no-store, must-revalidate",
-                },
-            )
+            headers = {
+                "Access-Control-Allow-Origin": "*",
+                "Cache-Control": "no-cache, no-store, must-revalidate",
+            }
+            if cache_hit:
+                headers["X-Cache-Hit"] = "true"
+            return aiohttp.web.Response(text=body, status=200, headers=headers)
         except Exception:
             logging.exception("Error while prompting Kiki")
             return aiohttp.web.Response(
@@ -678,23 +1975,45 @@ async def main(
                 status=500,
             )
 
-    audio_app = aiohttp.web.Application()
+    async def handle_kiki_stats(request: aiohttp.web.Request) -> aiohttp.web.Response:
+        return aiohttp.web.json_response(
+            kiki_cache.stats(), headers={"Access-Control-Allow-Origin": "*"}
+        )
+
+    capture = _CaptureLog(capture_log) if capture_log else None
+    if capture is not None:
+        print(f"Capturing requests to {capture_log}")
+    audio_app = aiohttp.web.Application(
+        middlewares=[capture.middleware("generate-audio")] if capture else []
+    )
     audio_app.router.add_post("/generate-audio/", handle_generate)
-    audio_runner = aiohttp.web.AppRunner(audio_app)
+    audio_app.router.add_get("/ready", handle_ready)
+    # Cancel handlers when the client disconnects, so abandoned requests stop
+    # using the GPU.
+    audio_runner = aiohttp.web.AppRunner(audio_app, handler_cancellation=True)
     await audio_runner.setup()
     audio_site = aiohttp.web.TCPSite(audio_runner, host, audio_port)
     await audio_site.start()
     print(f"Chatterbox interactor listening on http://{host}:{audio_port}/")
 
-    kiki_app = aiohttp.web.Application()
+    kiki_app = aiohttp.web.Application(
+        middlewares=[capture.middleware("kiki")] if capture else []
+    )
     kiki_app.router.add_get("/", handle_kiki)
+    kiki_app.router.add_get("/stats", handle_kiki_stats)
     kiki_runner = aiohttp.web.AppRunner(kiki_app)
     await kiki_runner.setup()
     kiki_site = aiohttp.web.TCPSite(kiki_runner, host, kiki_port)
     await kiki_site.start()
     print(f"Kiki interactor listening on http://{host}:{kiki_port}/")
 
+    relay_task = asyncio.create_task(_relay_metrics())
+    warmup_task = asyncio.create_task(_finish_warmup())
     try:
         await asyncio.Event().wait()
     finally:
+        relay_task.cancel()
+        warmup_task.cancel()
         await asyncio.gather(audio_runner.cleanup(), kiki_runner.cleanup())
+        if capture is not None:
+            capture.close()
@@ -0,0 +1,145 @@
+"""Replay a request capture against the TTS and Kiki frontends.
+
+    python tts_replay.py capture.jsonl --speed 4
+
+Captures come from ``modal run kiki_chatterbox_runner.py --capture-log
+capture.jsonl``. Requests are re-issued at their original spacing divided
+by ``--speed`` (0 sends them all at once), then throughput and
+p50/p95/p99 latency are reported per endpoint, next to the latencies that
+were captured.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import sys
+import time
+
+import aiohttp
+
+
+def _percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of ``values`` (``p`` in 0-100)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _load(path: str, endpoints: set[str] | None) -> list[dict]:
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if endpoints is None or entry["endpoint"] in endpoints:
+                entries.append(entry)
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+async def _issue(
+    session: aiohttp.ClientSession, base_urls: dict[str, str], entry: dict
+) -> tuple[int, float]:
+    url = base_urls[entry["endpoint"]] + entry["path"]
+    headers = {"Accept": entry["accept"]} if entry.get("accept") else {}
+    body = entry.get("body")
+    if isinstance(body, dict):
+        # A captured absolute deadline is long gone; let the frontend
+        # apply its own.
+        body = {k: v for k, v in body.items() if k != "deadline"}
+    started = time.monotonic()
+    try:
+        async with session.request(
+            entry["method"],
+            url,
+            params=entry.get("query") or None,
+            json=body,
+            headers=headers,
+        ) as resp:
+            await resp.read()
+            status = resp.status
+    except aiohttp.ClientError:
+        status = 0
+    return status, time.monotonic() - started
+
+
+async def replay(args: argparse.Namespace) -> None:
+    entries = _load(args.log, set(args.endpoint) if args.endpoint else None)
+    if not entries:
+        print("no requests to replay", file=sys.stderr)
+        sys.exit(1)
+    base_urls = {"generate-audio": args.audio_url, "kiki": args.kiki_url}
+
+    results: list[tuple[dict, int, float]] = []
+
+    async def _send(entry: dict, delay: float) -> None:
+        await asyncio.sleep(delay)
+        status, latency = await _issue(session, base_urls, entry)
+        results.append((entry, status, latency))
+
+    first = entries[0]["ts"]
+    started = time.monotonic()
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(
+            *(
+                _send(e, (e["ts"] - first) / args.speed if args.speed else 0.0)
+                for e in entries
+            )
+        )
+    elapsed = time.monotonic() - started
+
+    print(
+        f"replayed {len(results)} requests in {elapsed:.1f}s "
+        f"({len(results) / elapsed:.2f} req/s, speed {args.speed:g}x)"
+    )
+    by_endpoint: dict[str, list[tuple[dict, int, float]]] = collections.defaultdict(
+        list
+    )
+    for result in results:
+        by_endpoint[result[0]["endpoint"]].append(result)
+    for endpoint, rows in sorted(by_endpoint.items()):
+        statuses = collections.Counter(status for _, status, _ in rows)
+        print(f"\n{endpoint}: {len(rows)} requests, status {dict(statuses)}")
+        ok = [latency for _, status, latency in rows if status == 200]
+        captured = [e["latency"] for e, _, _ in rows if e.get("status") == 200]
+        for label, values in (("replayed", ok), ("captured", captured)):
+            if values:
+                print(
+                    f"  {label:>8}: p50 {_percentile(values, 50):7.3f}s  "
+                    f"p95 {_percentile(values, 95):7.3f}s  "
+                    f"p99 {_percentile(values, 99):7.3f}s"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument("log", help="JSONL written by --capture-log")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="replay speed; 2 halves the gaps, 0 sends everything at once",
+    )
+    parser.add_argument("--audio-url", default="http://localhost:8000")
+    parser.add_argument("--kiki-url", default="http://localhost:9124")
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        choices=["generate-audio", "kiki"],
+        help="only replay this endpoint (repeatable)",
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()